@@ -0,0 +1,10 @@
+"""
+Async client for the Rawls, BPM, LZ and ARM operations the command line tools perform, for driving many
+concurrent Terra operations from one event loop (e.g. in notebooks). Requires httpx (the `async` extra,
+`poetry install -E async`); the command line tools don't use it.
+"""
+
+from aio.client import TerraAsyncClient
+from aio.poll import poll_predicate
+
+__all__ = ["TerraAsyncClient", "poll_predicate"]
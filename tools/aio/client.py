@@ -0,0 +1,382 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Optional
+
+from aio.poll import poll_predicate
+from utils import auth, ipam, payloads
+from utils.conf import Configuration
+from utils.models import ArmResource, BillingProject, JobReport, ManagedApp, Workspace
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# mirrors utils.http.basic_http_retry
+RETRY_STATUSES = [502, 503, 504]
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1
+
+# GCP access tokens are valid for an hour; refresh well before that
+GCP_TOKEN_LIFETIME_SECONDS = 1800
+
+
+class TerraAsyncClient:
+    """
+    Coroutine versions of the Rawls, BPM, LZ and ARM calls made by the command line tools, over one pooled
+    connection per host. Hosts come from the initialized Configuration and tokens from utils.auth, so the client
+    authenticates exactly like the tools do; tokens are fetched off the event loop and shared by all requests.
+
+        Configuration.initialize("dev")
+        async with TerraAsyncClient() as client:
+            jobs = await asyncio.gather(*[client.create_landing_zone(id, "CromwellBaseResourcesFactory") for id in ...])
+    """
+
+    def __init__(self, max_connections: int = 100, timeout_seconds: float = 60):
+        if httpx is None:
+            raise ImportError(
+                "TerraAsyncClient requires httpx, install the async extra (`poetry install -E async`)"
+            )
+        self.config = Configuration.get_config()
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout_seconds,
+            transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+        )
+        self._token_lock = asyncio.Lock()
+        self._gcp_token: Optional[tuple[str, float]] = None
+        self._azure_token: Optional[tuple[str, float]] = None
+
+    async def __aenter__(self) -> "TerraAsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _gcp_headers(self) -> dict:
+        async with self._token_lock:
+            if self._gcp_token is None or self._gcp_token[1] <= time.time():
+                token = await asyncio.to_thread(auth.get_gcp_token)
+                self._gcp_token = (token, time.time() + GCP_TOKEN_LIFETIME_SECONDS)
+            return auth.build_auth_headers(self._gcp_token[0])
+
+    async def _azure_headers(self) -> dict:
+        async with self._token_lock:
+            if self._azure_token is None or self._azure_token[1] <= time.time():
+                access_token = await asyncio.to_thread(auth.get_azure_access_token)
+                self._azure_token = (access_token.token, access_token.expires_on - 60)
+            return auth.build_auth_headers(self._azure_token[0])
+
+    async def _request(self, method: str, url: str, headers: dict, **kwargs):
+        """
+        Sends a request, retrying gateway errors with exponential backoff like the synchronous session does.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            response = await self._client.request(
+                method, url, headers=headers, **kwargs
+            )
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            logging.debug("%s from %s %s, retrying", response.status_code, method, url)
+            await asyncio.sleep(BACKOFF_FACTOR * 2**attempt)
+
+    async def _gcp_request(self, method: str, url: str, **kwargs) -> Any:
+        response = await self._request(method, url, await self._gcp_headers(), **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    # Rawls
+
+    async def get_workspace_by_name(
+        self, workspace_name: str, billing_project_name: str
+    ) -> Optional[Workspace]:
+        """
+        :return: The workspace, or None if it doesn't exist
+        """
+        response = await self._request(
+            "GET",
+            f"{self.config['rawls_host']}/api/workspaces/{billing_project_name}/{workspace_name}",
+            await self._gcp_headers(),
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return Workspace.from_json(response.json())
+
+    async def get_workspace_by_id(self, workspace_id: str) -> Optional[Workspace]:
+        """
+        :return: The workspace, or None if it doesn't exist
+        """
+        response = await self._request(
+            "GET",
+            f"{self.config['rawls_host']}/api/workspaces/id/{workspace_id}",
+            await self._gcp_headers(),
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return Workspace.from_json(response.json())
+
+    async def delete_workspace(self, workspace_name: str, billing_project_name: str):
+        """
+        Starts the deletion of a workspace; poll get_workspace_by_name until it returns None to wait for it.
+        """
+        await self._gcp_request(
+            "DELETE",
+            f"{self.config['rawls_host']}/api/workspaces/v2/{billing_project_name}/{workspace_name}",
+        )
+
+    async def create_billing_project(
+        self,
+        billing_project_name: str,
+        subscription_id: str,
+        tenant_id: str,
+        protected_data: bool,
+    ):
+        """
+        Requests a billing project on an already deployed MRG named after the project, and waits until it is ready.
+        """
+        await self._gcp_request(
+            "POST",
+            self._billing_url(),
+            content=json.dumps(
+                payloads.billing_project_request(
+                    billing_project_name, subscription_id, tenant_id, protected_data
+                )
+            ),
+        )
+
+        async def bp_poller():
+            project = await self.get_billing_project(billing_project_name)
+            if project.status in ["CreatingLandingZone", "Creating"]:
+                return False, project
+            elif project.status == "Ready":
+                return True, project
+            raise Exception(
+                f"Error creating billing project => {project.status}, message = {project.message}"
+            )
+
+        _, project = await poll_predicate(
+            f"Billing project creation (name={billing_project_name})",
+            1800,
+            5,
+            bp_poller,
+            history_key="billing_project_creation",
+        )
+        return project
+
+    async def get_billing_project(self, billing_project_name: str) -> BillingProject:
+        return BillingProject.from_json(
+            await self._gcp_request(
+                "GET", f"{self._billing_url()}/{billing_project_name}"
+            )
+        )
+
+    async def delete_billing_project(self, billing_project_name: str):
+        """
+        Starts the deletion of a billing project.
+        """
+        await self._gcp_request(
+            "DELETE", f"{self._billing_url()}/{billing_project_name}"
+        )
+
+    async def get_members(self, billing_project_name: str) -> list[dict]:
+        return await self._gcp_request(
+            "GET", f"{self._billing_url()}/{billing_project_name}/members"
+        )
+
+    async def update_members(
+        self,
+        billing_project_name: str,
+        members_to_add: list[dict],
+        members_to_remove: list[dict],
+        invite_users_not_found=False,
+    ):
+        await self._gcp_request(
+            "PATCH",
+            f"{self._billing_url()}/{billing_project_name}/members",
+            params={"inviteUsersNotFound": str(invite_users_not_found)},
+            content=json.dumps(
+                {"membersToAdd": members_to_add, "membersToRemove": members_to_remove}
+            ),
+        )
+
+    def _billing_url(self) -> str:
+        return f"{self.config['rawls_host']}/api/billing/v2"
+
+    # BPM
+
+    async def list_managed_apps(
+        self, subscription_id: str, include_assigned: bool = False
+    ) -> list[ManagedApp]:
+        params = {"azureSubscriptionId": subscription_id}
+        if include_assigned:
+            params["includeAssignedApplications"] = "true"
+        data = await self._gcp_request(
+            "GET", f"{self.config['bpm_host']}/api/azure/v1/managedApps", params=params
+        )
+        return [
+            ManagedApp.from_json({"subscriptionId": subscription_id, **app})
+            for app in data["managedApps"]
+        ]
+
+    async def create_billing_profile(
+        self, subscription_id: str, managed_resource_group_id: str, tenant_id: str
+    ) -> dict:
+        return await self._gcp_request(
+            "POST",
+            f"{self.config['bpm_host']}/api/profiles/v1",
+            content=json.dumps(
+                payloads.billing_profile_request(
+                    subscription_id, managed_resource_group_id, tenant_id
+                )
+            ),
+        )
+
+    async def delete_billing_profile(self, billing_profile_id: str):
+        response = await self._request(
+            "DELETE",
+            f"{self.config['bpm_host']}/api/profiles/v1/{billing_profile_id}",
+            await self._gcp_headers(),
+        )
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    # LZ
+
+    async def create_landing_zone(
+        self, billing_profile_id: str, definition: str, supernet: str | None = None
+    ):
+        """
+        Requests a landing zone; with a supernet, its address space is allocated as in lz.create_landing_zone.
+        """
+        network_parameters = None
+        if supernet:
+            vnet = await asyncio.to_thread(
+                ipam.AddressAllocator(supernet).allocate, billing_profile_id
+            )
+            network_parameters = ipam.landing_zone_network_parameters(vnet)
+        return await self._gcp_request(
+            "POST",
+            f"{self.config['lz_host']}/api/landingzones/v1/azure",
+            content=json.dumps(
+                payloads.landing_zone_request(
+                    billing_profile_id, definition, network_parameters
+                )
+            ),
+        )
+
+    async def create_job_status(self, job_id: str) -> dict:
+        return await self._gcp_request(
+            "GET",
+            f"{self.config['lz_host']}/api/landingzones/v1/azure/create-result/{job_id}",
+        )
+
+    async def wait_for_landing_zone(self, job_id: str) -> dict:
+        """
+        Waits for a landing zone creation job to succeed.
+        """
+
+        async def lz_poller():
+            result = await self.create_job_status(job_id)
+            job_report = JobReport.from_json(result)
+            if job_report.running:
+                return False, job_report
+            if not job_report.succeeded:
+                raise Exception(f"lz creation failed => {result}")
+            return True, result
+
+        _, result = await poll_predicate(
+            f"landing zone creation (job_id={job_id})",
+            1200,
+            5,
+            lz_poller,
+            history_key="lz_creation",
+        )
+        return result
+
+    async def list_landing_zones(self, billing_profile_id: str) -> list[dict]:
+        data = await self._gcp_request(
+            "GET",
+            f"{self.config['lz_host']}/api/landingzones/v1/azure",
+            params={"billingProfileId": billing_profile_id},
+        )
+        return data["landingzones"]
+
+    async def delete_landing_zone(self, landing_zone_id: str) -> dict:
+        """
+        Starts the deletion of a landing zone; the result holds the deletion job's report.
+        """
+        return await self._gcp_request(
+            "POST",
+            f"{self.config['lz_host']}/api/landingzones/v1/azure/{landing_zone_id}",
+            content=json.dumps(payloads.landing_zone_deletion_request()),
+        )
+
+    # ARM
+
+    async def deploy_managed_application(
+        self,
+        subscription_id: str,
+        deployment_name: str,
+        resource_group: str,
+        authorized_terra_users: list[str],
+        plan: str,
+        location: str = "southcentralus",
+    ) -> ArmResource:
+        """
+        Deploys a managed application and waits until it is provisioned.
+        """
+        url = payloads.managed_application_url(
+            subscription_id, resource_group, deployment_name, "2018-06-01"
+        )
+        body = payloads.managed_application_request(
+            subscription_id, deployment_name, authorized_terra_users, plan, location
+        )
+        response = await self._request(
+            "PUT", url, await self._azure_headers(), content=json.dumps(body)
+        )
+        response.raise_for_status()
+
+        async def app_state_poller():
+            app = await self._request("GET", url, await self._azure_headers())
+            app.raise_for_status()
+            data = app.json()
+            resource = ArmResource.from_json(data)
+            if resource.provisioning_state in payloads.MRG_NOT_READY_STATES:
+                return False, resource
+            elif resource.provisioning_state in payloads.MRG_READY_STATES:
+                return True, resource
+            raise Exception(f"MRG creation failed => {data}")
+
+        _, resource = await poll_predicate(
+            f"MRG creation (deployment_name={deployment_name})",
+            300,
+            5,
+            app_state_poller,
+            history_key="mrg_creation",
+        )
+        return resource
+
+    async def delete_managed_application(
+        self, subscription_id: str, deployment_name: str, resource_group: str
+    ):
+        """
+        Starts the deletion of a managed application; ARM deletes it asynchronously.
+        """
+        response = await self._request(
+            "DELETE",
+            payloads.managed_application_url(
+                subscription_id, resource_group, deployment_name, "2019-07-01"
+            ),
+            await self._azure_headers(),
+        )
+        response.raise_for_status()
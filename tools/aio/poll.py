@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from utils import profiling
+from utils.poll import PollLoop
+
+
+async def poll_predicate(
+    name: str,
+    max_wait_time_seconds: int,
+    poll_interval_seconds: int,
+    poll_fn: Callable[[], Awaitable[tuple[Any, Any]]],
+    history_key: Optional[str] = None,
+) -> tuple[Any, Any]:
+    """
+    Coroutine counterpart of utils.poll.poll_predicate: awaits poll_fn until it reports completion or the wait
+    times out, sleeping without blocking the event loop in between. Scheduling, progress reporting and duration
+    history are shared with synchronous waits through utils.poll.PollLoop.
+    """
+    with PollLoop(
+        name, max_wait_time_seconds, poll_interval_seconds, history_key=history_key
+    ) as loop:
+        while loop.running():
+            (status, result) = await poll_fn()
+            if status:
+                return loop.succeeded(status, result)
+
+            interval = loop.next_interval(result)
+            with profiling.phase("poll wait", name):
+                await asyncio.sleep(interval)
+            loop.waited(interval)
+
+    raise loop.timed_out()
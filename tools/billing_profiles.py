@@ -3,35 +3,158 @@ Utility for working with Terra Billing Profiles
 """
 
 import argparse
+import csv
 import json
 import logging
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Iterator
 
 import requests
 import sys
 
-from utils import auth, cli
+from utils import auth, cli, http
+from utils.bulk import run_concurrently
 from utils.conf import Configuration
-import uuid
+from utils.http import get_session_with_retry
+from utils.jsonstream import iter_items
+from utils.models import BillingProfile, ManagedApp
+from utils.payloads import billing_profile_request
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
 )
 
 
-def list_managed_apps(host: str, subscription_id: str):
+def list_managed_apps(host: str, subscription_id: str, include_assigned: bool = False):
     token = auth.get_gcp_token()
     logging.info(f"Getting managed apps from BPM {host}")
     url = f"{host}/api/azure/v1/managedApps?azureSubscriptionId={subscription_id}"
+    if include_assigned:
+        url += "&includeAssignedApplications=true"
 
     headers = {
         "content-type": "application/json",
         "Authorization": f"Bearer {token}",
     }
 
-    result = requests.get(url, headers=headers)
+    result = http.get_session().get(url, headers=headers)
     return result.json()
 
 
+def iter_managed_apps(
+    host: str,
+    subscription_id: str,
+    include_assigned: bool = False,
+    session: requests.Session | None = None,
+) -> Iterator[ManagedApp]:
+    """
+    Like list_managed_apps, but decodes the listing incrementally and yields one managed app at a time.
+    Callers that stop iterating early skip reading the rest of the listing. Pass a shared session to reuse
+    pooled connections across calls.
+    """
+    if session is None:
+        session = http.get_session()
+
+    token = auth.get_gcp_token()
+    logging.info(f"Getting managed apps from BPM {host}")
+    url = f"{host}/api/azure/v1/managedApps"
+    params = {"azureSubscriptionId": subscription_id}
+    if include_assigned:
+        params["includeAssignedApplications"] = "true"
+
+    with session.get(
+        url, headers=auth.build_auth_headers(token), params=params, stream=True
+    ) as result:
+        result.raise_for_status()
+        for app in iter_items(result, "managedApps", ManagedApp.FIELDS):
+            yield ManagedApp.from_json({"subscriptionId": subscription_id, **app})
+
+
+@dataclass
+class ManagedAppInventory:
+    """
+    Managed apps merged from many subscriptions, indexed by deployment name, MRG id and tenant, along with the
+    subscriptions that couldn't be listed.
+    """
+
+    apps: list[ManagedApp] = field(default_factory=list)
+    failed_subscriptions: list[str] = field(default_factory=list)
+    by_deployment_name: dict[str, list[ManagedApp]] = field(default_factory=dict)
+    by_mrg_id: dict[str, ManagedApp] = field(default_factory=dict)
+    by_tenant: dict[str, list[ManagedApp]] = field(default_factory=dict)
+
+    def add(self, app: ManagedApp):
+        self.apps.append(app)
+        self.by_deployment_name.setdefault(app.deployment_name, []).append(app)
+        self.by_mrg_id[app.managed_resource_group_id] = app
+        self.by_tenant.setdefault(app.tenant_id, []).append(app)
+
+
+def build_inventory(
+    host: str,
+    subscription_ids: list[str],
+    include_assigned: bool = True,
+    max_workers: int = 16,
+) -> ManagedAppInventory:
+    """
+    Lists the managed apps of every subscription concurrently over one pooled session and merges them into an
+    indexed inventory. Subscriptions that fail to list are logged, left out and recorded in failed_subscriptions.
+    """
+    session = get_session_with_retry(pool_size=max_workers)
+    list_apps = partial(
+        _list_managed_apps_for_inventory, host, include_assigned, session
+    )
+
+    inventory = ManagedAppInventory()
+    for result in run_concurrently(
+        subscription_ids, list_apps, max_workers, "Managed app listing"
+    ):
+        if not result.succeeded:
+            inventory.failed_subscriptions.append(result.item)
+        for app in result.result or []:
+            inventory.add(app)
+    return inventory
+
+
+def _list_managed_apps_for_inventory(
+    host: str, include_assigned: bool, session: requests.Session, subscription_id: str
+) -> list[ManagedApp]:
+    return list(iter_managed_apps(host, subscription_id, include_assigned, session))
+
+
+def mrg_key(subscription_id: str, managed_resource_group_id: str) -> tuple[str, str]:
+    # MRG ids are recorded as either the bare resource group name or its full ARM id, and Azure ids are
+    # case-insensitive, so ARM and BPM may spell the same one differently
+    return (
+        subscription_id.lower(),
+        managed_resource_group_id.rsplit("/", 1)[-1].lower(),
+    )
+
+
+def find_apps_without_profiles(
+    host: str, subscription_ids: list[str], max_workers: int = 16
+) -> ManagedAppInventory:
+    """
+    Finds the managed apps of the subscriptions that no billing profile points at. BPM only lists unassigned apps
+    here, so apps whose profile belongs to someone else are never candidates; as a second check, the apps are
+    joined on subscription and managed resource group against a hash index of the profiles the caller can see.
+    :return: The apps missing a profile, and the subscriptions that couldn't be listed
+    """
+    inventory = build_inventory(host, subscription_ids, False, max_workers)
+    profile_keys = {
+        mrg_key(p.subscription_id, p.managed_resource_group_id)
+        for p in list_billing_profiles(host)
+        if p.subscription_id and p.managed_resource_group_id
+    }
+    missing = ManagedAppInventory(failed_subscriptions=inventory.failed_subscriptions)
+    for app in inventory.apps:
+        key = mrg_key(app.subscription_id, app.managed_resource_group_id)
+        if not app.assigned and key not in profile_keys:
+            missing.add(app)
+    return missing
+
+
 def create_billing_profile(
     host: str, subscription_id: str, managed_resource_group_id: str, tenant_id: str
 ):
@@ -45,23 +168,58 @@ def create_billing_profile(
         "Authorization": f"Bearer {token}",
     }
 
-    body = {
-        "id": f"{uuid.uuid4()}",
-        "biller": "direct",
-        "displayName": "string",
-        "description": "string",
-        "cloudPlatform": "AZURE",
-        "tenantId": tenant_id,
-        "subscriptionId": subscription_id,
-        "managedResourceGroupId": managed_resource_group_id,
-    }
+    body = billing_profile_request(
+        subscription_id, managed_resource_group_id, tenant_id
+    )
 
-    result = requests.post(url, headers=headers, data=json.dumps(body))
+    result = http.get_session().post(url, headers=headers, data=json.dumps(body))
     result.raise_for_status()
 
     return result.json()
 
 
+def list_billing_profiles(host: str, page_size: int = 1000) -> list[BillingProfile]:
+    """
+    Lists all billing profiles visible to the caller, following BPM's offset/limit paging. Pages are decoded
+    incrementally, keeping only the fields of the BillingProfile model.
+    """
+    token = auth.get_gcp_token()
+    logging.info(f"Getting billing profiles from BPM {host}")
+    url = f"{host}/api/profiles/v1"
+
+    profiles: list[BillingProfile] = []
+    while True:
+        with http.get_session().get(
+            url,
+            headers=auth.build_auth_headers(token),
+            params={"offset": len(profiles), "limit": page_size},
+            stream=True,
+        ) as result:
+            result.raise_for_status()
+            items = [
+                BillingProfile.from_json(p)
+                for p in iter_items(result, "items", BillingProfile.FIELDS)
+            ]
+        # BPM may cap the page below the limit asked for, so only an empty page marks the end
+        if not items:
+            return profiles
+        profiles.extend(items)
+
+
+def delete_billing_profile(host: str, billing_profile_id: str):
+    token = auth.get_gcp_token()
+    logging.info(f"Deleting billing profile {billing_profile_id}...")
+
+    url = f"{host}/api/profiles/v1/{billing_profile_id}"
+    result = http.get_session().delete(url, headers=auth.build_auth_headers(token))
+    if result.status_code == 404:
+        logging.info(
+            f"Billing profile {billing_profile_id} is gone, skipping deletion."
+        )
+        return
+    result.raise_for_status()
+
+
 def _bpm_managed_apps_cmd(args):
     result = list_managed_apps(
         Configuration.get_config()["bpm_host"], args.subscription_id
@@ -69,6 +227,106 @@ def _bpm_managed_apps_cmd(args):
     logging.info(json.dumps(result, indent=4))
 
 
+def _subscription_ids(args) -> list[str]:
+    subscription_ids = list(args.subscription_ids or [])
+    if args.subscriptions_file:
+        with open(args.subscriptions_file, mode="r") as f:
+            subscription_ids.extend(line.strip() for line in f if line.strip())
+    if not subscription_ids:
+        logging.error("Must specify subscription ids or a subscriptions file")
+        sys.exit(1)
+    return sorted(set(subscription_ids))
+
+
+def _inventory_cmd(args):
+    if not args.output_file:
+        cli.log_to_stderr()
+    subscription_ids = _subscription_ids(args)
+    inventory = build_inventory(
+        Configuration.get_config()["bpm_host"],
+        subscription_ids,
+        not args.unassigned_only,
+        args.concurrency,
+    )
+
+    apps = inventory.apps
+    if args.deployment_name:
+        apps = inventory.by_deployment_name.get(args.deployment_name, [])
+    elif args.mrg_id:
+        apps = (
+            [inventory.by_mrg_id[args.mrg_id]]
+            if args.mrg_id in inventory.by_mrg_id
+            else []
+        )
+    elif args.tenant_id:
+        apps = inventory.by_tenant.get(args.tenant_id, [])
+
+    output = open(args.output_file, mode="w") if args.output_file else sys.stdout
+    try:
+        if args.output_format == "jsonl":
+            for app in apps:
+                output.write(json.dumps(app.to_json()) + "\n")
+        else:
+            writer = csv.DictWriter(output, fieldnames=ManagedApp.FIELDS)
+            writer.writeheader()
+            writer.writerows(app.to_json() for app in apps)
+    finally:
+        if args.output_file:
+            output.close()
+
+    logging.info(
+        f"{len(apps)} managed apps across {len(inventory.by_tenant)} tenants and {len(subscription_ids)} subscriptions"
+    )
+    if inventory.failed_subscriptions:
+        logging.error(
+            f"Unable to list managed apps of subscriptions {inventory.failed_subscriptions}"
+        )
+        sys.exit(1)
+
+
+def _backfill_cmd(args):
+    host = Configuration.get_config()["bpm_host"]
+    missing = find_apps_without_profiles(
+        host, _subscription_ids(args), args.concurrency
+    )
+    if missing.failed_subscriptions:
+        logging.error(
+            f"Unable to list managed apps of subscriptions {missing.failed_subscriptions}"
+        )
+    apps = missing.apps
+    for app in apps:
+        logging.info(
+            f"No billing profile for managed app {app.deployment_name} [subscription={app.subscription_id}, mrg={app.managed_resource_group_id}]"
+        )
+    logging.info(f"{len(apps)} managed apps are missing a billing profile")
+    if args.dry_run or not apps:
+        if missing.failed_subscriptions:
+            sys.exit(1)
+        return
+
+    results = run_concurrently(
+        apps,
+        lambda app: create_billing_profile(
+            host, app.subscription_id, app.managed_resource_group_id, app.tenant_id
+        ),
+        max_workers=args.concurrency,
+        name="Billing profile creation",
+        adaptive=True,
+    )
+    for result in results:
+        if result.succeeded:
+            logging.info(
+                f"Created billing profile {result.result['id']} for {result.item.deployment_name}"
+            )
+
+    failures = len([r for r in results if not r.succeeded])
+    logging.info(
+        f"Created {len(results) - failures} of {len(results)} billing profiles"
+    )
+    if failures or missing.failed_subscriptions:
+        sys.exit(1)
+
+
 def _bpm_create_cmd(args):
     result = create_billing_profile(
         Configuration.get_config()["bpm_host"],
@@ -91,6 +349,35 @@ if __name__ == "__main__":
     mrg_subparser.add_argument("-s", "--subscription_id", required=True)
     mrg_subparser.set_defaults(func=_bpm_managed_apps_cmd)
 
+    inventory_subparser = subparsers.add_parser("inventory")
+    inventory_subparser.add_argument("-s", "--subscription_ids", nargs="+")
+    inventory_subparser.add_argument("-f", "--subscriptions_file", required=False)
+    inventory_subparser.add_argument(
+        "-o", "--output_format", choices=["csv", "jsonl"], default="csv"
+    )
+    inventory_subparser.add_argument("-O", "--output_file", required=False)
+    inventory_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=16, type=int
+    )
+    inventory_subparser.add_argument(
+        "--unassigned_only", required=False, default=False, action="store_true"
+    )
+    inventory_subparser.add_argument("--deployment_name", required=False)
+    inventory_subparser.add_argument("--mrg_id", required=False)
+    inventory_subparser.add_argument("--tenant_id", required=False)
+    inventory_subparser.set_defaults(func=_inventory_cmd)
+
+    backfill_subparser = subparsers.add_parser("backfill")
+    backfill_subparser.add_argument("-s", "--subscription_ids", nargs="+")
+    backfill_subparser.add_argument("-f", "--subscriptions_file", required=False)
+    backfill_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=16, type=int
+    )
+    backfill_subparser.add_argument(
+        "--dry_run", required=False, default=False, action="store_true"
+    )
+    backfill_subparser.set_defaults(func=_backfill_cmd)
+
     create_subparser = subparsers.add_parser("create")
     create_subparser.set_defaults(func=_bpm_create_cmd)
     create_subparser.add_argument("-s", "--subscription_id", required=True)
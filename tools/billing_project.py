@@ -6,14 +6,18 @@ import argparse
 import json
 import logging
 import sys
-import requests
 from requests import HTTPError
+from requests.exceptions import RetryError
 import csv
 
 import mrg
-from utils import auth, poll, cli
+from utils import auth, http, poll, cli
 from utils.conf import Configuration
 from utils.http import is_response_5xx
+from utils.jobs import Checkpoint
+from utils.jsonstream import iter_items
+from utils.models import BillingProject
+from utils.payloads import billing_project_request
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
@@ -32,40 +36,59 @@ def create_billing_project(
     tenant_id: str,
     protected_data: bool,
     location: str = "southcentralus",
+    checkpoint: Checkpoint | None = None,
 ):
-    mrg.deploy_managed_application(
-        subscription_id,
-        billing_project_name,
-        resource_group,
-        authorized_terra_users,
-        Configuration.get_config()["plan"],
-        location,
-    )
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+    resuming = bool(checkpoint.state["stages"])
+
+    if not checkpoint.done("mrg_deployed"):
+        mrg.deploy_managed_application(
+            subscription_id,
+            billing_project_name,
+            resource_group,
+            authorized_terra_users,
+            Configuration.get_config()["plan"],
+            location,
+        )
+        checkpoint.save("mrg_deployed")
 
-    body = {
-        "projectName": billing_project_name,
-        "managedAppCoordinates": {
-            "tenantId": tenant_id,
-            "subscriptionId": subscription_id,
-            "managedResourceGroupId": billing_project_name,
-        },
-        "protectedData": protected_data,
-    }
+    body = billing_project_request(
+        billing_project_name, subscription_id, tenant_id, protected_data
+    )
 
     billing_url = _get_rawls_billing_url()
-    result = requests.post(
-        billing_url,
-        headers=auth.build_auth_headers(auth.get_gcp_token()),
-        data=json.dumps(body),
-    )
-    result.raise_for_status()
+    # an interrupted run may have requested the project without getting to record it
+    if (
+        resuming
+        and not checkpoint.done("project_requested")
+        and _billing_project_exists(billing_url, billing_project_name)
+    ):
+        logging.info(f"Billing project {billing_project_name} already requested")
+        checkpoint.save("project_requested")
+    if not checkpoint.done("project_requested"):
+        result = http.get_session().post(
+            billing_url,
+            headers=auth.build_auth_headers(auth.get_gcp_token()),
+            data=json.dumps(body),
+        )
+        if resuming and result.status_code == 409:
+            logging.info(f"Billing project {billing_project_name} already requested")
+        else:
+            result.raise_for_status()
+        checkpoint.save("project_requested")
 
     def bp_poller():
         polling_url = f"{billing_url}/{billing_project_name}"
 
-        bp_result = requests.get(
-            polling_url, headers=auth.build_auth_headers(auth.get_gcp_token())
-        )
+        try:
+            bp_result = http.get_session().get(
+                polling_url, headers=auth.build_auth_headers(auth.get_gcp_token())
+            )
+        except RetryError as e:
+            # the session gave up retrying a persistent 5xx; keep polling until the timeout
+            logging.warning(f"rawls still failing after retries, retrying => {e}")
+            return False, None
         try:
             bp_result.raise_for_status()
         except HTTPError as e:
@@ -75,23 +98,36 @@ def create_billing_project(
             else:
                 raise e
 
-        data = bp_result.json()
-        status = data["status"]
-        message = data.get("message")
-        if status == "CreatingLandingZone":
-            return False, data
-        elif status == "Creating":
-            return False, data
-        elif status == "Ready":
-            return True, data
+        project = BillingProject.from_json(bp_result.json())
+        if project.status == "CreatingLandingZone":
+            return False, project
+        elif project.status == "Creating":
+            return False, project
+        elif project.status == "Ready":
+            return True, project
         else:
             raise BillingProjectException(
-                f"Error creating billing project => {status}, message = {message}"
+                f"Error creating billing project => {project.status}, message = {project.message}"
             )
 
     poll.poll_predicate(
-        f"Billing project creation (name={billing_project_name})", 1800, 5, bp_poller
+        f"Billing project creation (name={billing_project_name})",
+        1800,
+        5,
+        bp_poller,
+        history_key="billing_project_creation",
+    )
+
+
+def _billing_project_exists(billing_url: str, billing_project_name: str) -> bool:
+    result = http.get_session().get(
+        f"{billing_url}/{billing_project_name}",
+        headers=auth.build_auth_headers(auth.get_gcp_token()),
     )
+    if result.status_code == 404:
+        return False
+    result.raise_for_status()
+    return True
 
 
 def add_users(
@@ -108,7 +144,7 @@ def add_users(
     :param: invite_users_not_found: Whether to invite users that are not already registered for Terra
     """
     billing_url = _get_rawls_billing_url()
-    result = requests.get(
+    result = http.get_session().get(
         f"{billing_url}/{billing_project_name}",
         headers=auth.build_auth_headers(auth.get_gcp_token()),
     )
@@ -120,22 +156,14 @@ def add_users(
             f"Billing project {billing_project_name} is not ready, status = {data['status']}"
         )
 
-    payload = {
-        "membersToAdd": [
-            {"email": f"{user_email}", "role": role} for user_email in user_emails
-        ],
-        "membersToRemove": [],
-    }
-
     try:
         logging.info(f"Adding users to billing project {billing_project_name}...")
-        result = requests.patch(
-            f"{billing_url}/{billing_project_name}/members",
-            headers=auth.build_auth_headers(auth.get_gcp_token()),
-            params={"inviteUsersNotFound": invite_users_not_found},
-            data=json.dumps(payload),
+        update_members(
+            billing_project_name,
+            [{"email": f"{user_email}", "role": role} for user_email in user_emails],
+            [],
+            invite_users_not_found,
         )
-        result.raise_for_status()
     except HTTPError as e:
         if e.response:
             logging.error(e.response.text)
@@ -143,14 +171,68 @@ def add_users(
     logging.info("Users added.")
 
 
-def list_billing_projects():
+def get_members(billing_project_name: str) -> list[dict]:
+    """
+    Gets the members of the billing project as a list of {"email", "role"} entries
+    """
+    billing_url = _get_rawls_billing_url()
+    result = http.get_session().get(
+        f"{billing_url}/{billing_project_name}/members",
+        headers=auth.build_auth_headers(auth.get_gcp_token()),
+    )
+    result.raise_for_status()
+
+    return result.json()
+
+
+def update_members(
+    billing_project_name: str,
+    members_to_add: list[dict],
+    members_to_remove: list[dict],
+    invite_users_not_found=False,
+):
+    """
+    Adds and removes billing project members in a single request.
+    :param billing_project_name: Name of the billing project to update
+    :param members_to_add: List of {"email", "role"} entries to add
+    :param members_to_remove: List of {"email", "role"} entries to remove
+    :param invite_users_not_found: Whether to invite users that are not already registered for Terra
+    """
     billing_url = _get_rawls_billing_url()
-    result = requests.get(
-        billing_url, headers=auth.build_auth_headers(auth.get_gcp_token())
+    payload = {
+        "membersToAdd": members_to_add,
+        "membersToRemove": members_to_remove,
+    }
+
+    result = http.get_session().patch(
+        f"{billing_url}/{billing_project_name}/members",
+        headers=auth.build_auth_headers(auth.get_gcp_token()),
+        params={"inviteUsersNotFound": invite_users_not_found},
+        data=json.dumps(payload),
     )
     result.raise_for_status()
 
-    project_names = [p["projectName"] for p in result.json()]
+
+def get_billing_projects() -> list[BillingProject]:
+    """
+    Gets all billing projects the caller has access to from rawls. The listing is decoded incrementally,
+    keeping only the fields of the BillingProject model.
+    """
+    billing_url = _get_rawls_billing_url()
+    with http.get_session().get(
+        billing_url,
+        headers=auth.build_auth_headers(auth.get_gcp_token()),
+        stream=True,
+    ) as result:
+        result.raise_for_status()
+        return [
+            BillingProject.from_json(p)
+            for p in iter_items(result, fields=BillingProject.FIELDS)
+        ]
+
+
+def list_billing_projects():
+    project_names = [p.project_name for p in get_billing_projects()]
     [logging.info(project_name) for project_name in sorted(project_names)]
 
 
@@ -176,20 +258,31 @@ def _create_billing_project_cmd(args):
         sys.exit(1)
 
 
-def delete_billing_project(billing_project_name: str):
-    billing_url = _get_rawls_billing_url()
+def delete_billing_project(
+    billing_project_name: str, checkpoint: Checkpoint | None = None
+):
+    if checkpoint is None:
+        checkpoint = Checkpoint()
 
-    result = requests.delete(
-        f"{billing_url}/{billing_project_name}",
-        headers=auth.build_auth_headers(auth.get_gcp_token()),
-    )
-    result.raise_for_status()
+    billing_url = _get_rawls_billing_url()
 
-    def _billing_deletion_poller():
-        raw_status = requests.get(
+    if not checkpoint.done("deletion_requested"):
+        result = http.get_session().delete(
             f"{billing_url}/{billing_project_name}",
             headers=auth.build_auth_headers(auth.get_gcp_token()),
         )
+        result.raise_for_status()
+        checkpoint.save("deletion_requested")
+
+    def _billing_deletion_poller():
+        try:
+            raw_status = http.get_session().get(
+                f"{billing_url}/{billing_project_name}",
+                headers=auth.build_auth_headers(auth.get_gcp_token()),
+            )
+        except RetryError as e:
+            logging.warning(f"rawls still failing after retries, retrying => {e}")
+            return False, None
         try:
             raw_status.raise_for_status()
         except HTTPError as e:
@@ -200,21 +293,20 @@ def delete_billing_project(billing_project_name: str):
                 return False, None
             raise e
 
-        data = raw_status.json()
-        status = data["status"]
-        message = data.get("message")
-        if status in ["DeletionFailed"]:
+        project = BillingProject.from_json(raw_status.json())
+        if project.status in ["DeletionFailed"]:
             raise BillingProjectException(
-                f"Billing project deletion failed, billing project status = {status}, message = {message}"
+                f"Billing project deletion failed, billing project status = {project.status}, message = {project.message}"
             )
 
-        return False, status
+        return False, project.status
 
     poll.poll_predicate(
         f"Billing project deletion (name={billing_project_name})",
         7200,
         5,
         _billing_deletion_poller,
+        history_key="billing_project_deletion",
     )
 
     logging.info("Deleted billing project")
@@ -0,0 +1,373 @@
+"""
+Utility for declaratively managing a fleet of Terra Azure billing projects and landing zones.
+
+The fleet is described by a JSON spec file:
+
+{
+    "billing_projects": [
+        {
+            "name": "...", "subscription_id": "...", "tenant_id": "...", "resource_group": "...",
+            "users": ["..."], "protected_data": false, "location": "southcentralus",
+            "members": [{"email": "...", "role": "User"}]
+        }
+    ],
+    "landing_zones": [
+        {
+            "deployment_name": "...", "subscription_id": "...", "resource_group": "...",
+            "authed_user": "...", "definition": "standard", "location": "southcentralus",
+            "supernet": "10.0.0.0/8"
+        }
+    ],
+    "prune_prefix": "fleet-"
+}
+
+`plan` fetches the current state in parallel and prints the changes needed to reach the spec; `apply` executes
+them concurrently, in dependency order. Billing projects whose name starts with prune_prefix and which are not in
+the spec are deleted; members not in a project's spec are only removed when --prune_members is given. Landing
+zones with a supernet get a non-overlapping VNet address space allocated from it.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable
+
+from tabulate import tabulate
+
+import billing_profiles
+import billing_project
+import lz
+from utils import cli
+from utils.bulk import run_concurrently
+from utils.conf import Configuration
+from utils.jobs import Checkpoint
+from utils.models import ManagedApp
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
+)
+
+# actions in a wave only run once every action in the previous wave has finished
+WAVE_RESOURCES = 0
+WAVE_MEMBERSHIPS = 1
+
+
+@dataclass
+class FleetAction:
+    wave: int
+    action: str
+    resource: str
+    detail: str
+    execute: Callable[[], Any]
+
+
+class FleetException(Exception):
+    pass
+
+
+def load_spec(spec_file: str) -> dict:
+    with open(spec_file, mode="r") as f:
+        spec = json.load(f)
+
+    spec.setdefault("billing_projects", [])
+    spec.setdefault("landing_zones", [])
+    for landing_zone in spec["landing_zones"]:
+        if landing_zone["definition"] not in lz.DEFINITIONS:
+            raise FleetException(
+                f"Definition must be one of {list(lz.DEFINITIONS)}, {landing_zone['definition']} found"
+            )
+    return spec
+
+
+def fetch_state(spec: dict, max_workers: int = 16) -> dict:
+    """
+    Fetches the current state of everything the spec refers to. Independent listings run concurrently, and
+    per-resource lookups (project members, landing zones per billing profile) fan out concurrently after them.
+    """
+    config = Configuration.get_config()
+    subscription_ids = sorted({z["subscription_id"] for z in spec["landing_zones"]})
+
+    listings: dict[str, Callable[[], Any]] = {
+        "projects": billing_project.get_billing_projects,
+        "profiles": lambda: (
+            billing_profiles.list_billing_profiles(config["bpm_host"])
+            if subscription_ids
+            else []
+        ),
+    }
+    for subscription_id in subscription_ids:
+        listings[f"apps:{subscription_id}"] = partial(
+            _list_managed_apps, config["bpm_host"], subscription_id
+        )
+    results = {
+        r.item: r
+        for r in run_concurrently(
+            listings, lambda key: listings[key](), max_workers, "State fetch"
+        )
+    }
+    failed = [key for key, r in results.items() if not r.succeeded]
+    if failed:
+        raise FleetException(f"Unable to fetch current state for {failed}")
+
+    projects = {p.project_name: p for p in results["projects"].result}
+
+    apps_by_deployment = {
+        (app.subscription_id, app.deployment_name): app
+        for subscription_id in subscription_ids
+        for app in results[f"apps:{subscription_id}"].result
+    }
+    profiles_by_mrg = {
+        billing_profiles.mrg_key(p.subscription_id, p.managed_resource_group_id): p
+        for p in results["profiles"].result
+        if p.managed_resource_group_id
+    }
+
+    spec_project_names = [
+        p["name"] for p in spec["billing_projects"] if p["name"] in projects
+    ]
+    member_listings = run_concurrently(
+        spec_project_names,
+        billing_project.get_members,
+        max_workers,
+        "Member listing",
+    )
+    failed = [r.item for r in member_listings if not r.succeeded]
+    if failed:
+        raise FleetException(f"Unable to fetch members of billing projects {failed}")
+    members = {r.item: r.result for r in member_listings}
+
+    profile_ids = [
+        profiles_by_mrg[key].id
+        for key in (
+            billing_profiles.mrg_key(app.subscription_id, app.managed_resource_group_id)
+            for app in apps_by_deployment.values()
+        )
+        if key in profiles_by_mrg
+    ]
+    lz_listings = run_concurrently(
+        profile_ids,
+        partial(lz.list_landing_zones, config["lz_host"]),
+        max_workers,
+        "Landing zone listing",
+    )
+    failed = [r.item for r in lz_listings if not r.succeeded]
+    if failed:
+        raise FleetException(
+            f"Unable to fetch landing zones of billing profiles {failed}"
+        )
+    landing_zones = {r.item: r.result for r in lz_listings}
+
+    return {
+        "projects": projects,
+        "members": members,
+        "apps_by_deployment": apps_by_deployment,
+        "profiles_by_mrg": profiles_by_mrg,
+        "landing_zones": landing_zones,
+    }
+
+
+def _list_managed_apps(bpm_host: str, subscription_id: str) -> list[ManagedApp]:
+    return list(
+        billing_profiles.iter_managed_apps(
+            bpm_host, subscription_id, include_assigned=True
+        )
+    )
+
+
+def plan(spec: dict, state: dict, prune_members: bool = False) -> list[FleetAction]:
+    """
+    Diffs the spec against the current state and returns the actions needed to reconcile them.
+    """
+    actions = []
+
+    for project in spec["billing_projects"]:
+        name = project["name"]
+        desired = {(m["email"].lower(), m["role"]) for m in project.get("members", [])}
+        if name not in state["projects"]:
+            actions.append(
+                FleetAction(
+                    WAVE_RESOURCES,
+                    "create",
+                    f"billing_project/{name}",
+                    f"subscription={project['subscription_id']}",
+                    partial(
+                        billing_project.create_billing_project,
+                        name,
+                        project["subscription_id"],
+                        project["resource_group"],
+                        project["users"],
+                        project["tenant_id"],
+                        project.get("protected_data", False),
+                        project.get("location", "southcentralus"),
+                    ),
+                )
+            )
+            current = set()
+        else:
+            current = {
+                (m["email"].lower(), m["role"]) for m in state["members"].get(name, [])
+            }
+
+        to_add = sorted(desired - current)
+        to_remove = sorted(current - desired) if prune_members else []
+        if to_add or to_remove:
+            actions.append(
+                FleetAction(
+                    WAVE_MEMBERSHIPS,
+                    "update_members",
+                    f"billing_project/{name}",
+                    f"add={len(to_add)}, remove={len(to_remove)}",
+                    partial(
+                        billing_project.update_members,
+                        name,
+                        [{"email": e, "role": r} for e, r in to_add],
+                        [{"email": e, "role": r} for e, r in to_remove],
+                    ),
+                )
+            )
+
+    prune_prefix = spec.get("prune_prefix")
+    if prune_prefix:
+        spec_names = {p["name"] for p in spec["billing_projects"]}
+        for name in sorted(state["projects"]):
+            if name.startswith(prune_prefix) and name not in spec_names:
+                actions.append(
+                    FleetAction(
+                        WAVE_RESOURCES,
+                        "delete",
+                        f"billing_project/{name}",
+                        "not in spec",
+                        partial(billing_project.delete_billing_project, name),
+                    )
+                )
+
+    for landing_zone in spec["landing_zones"]:
+        action = _plan_landing_zone(landing_zone, state)
+        if action:
+            actions.append(action)
+
+    return actions
+
+
+def _plan_landing_zone(landing_zone: dict, state: dict) -> FleetAction | None:
+    """
+    Landing zones are created with the e2e flow. Stages that already exist (the MRG, its billing profile) are
+    marked done on the checkpoint so that only the missing stages are executed.
+    """
+    deployment_name = landing_zone["deployment_name"]
+    subscription_id = landing_zone["subscription_id"]
+    checkpoint = Checkpoint()
+    checkpoint.save("named", deployment_name=deployment_name)
+
+    app = state["apps_by_deployment"].get((subscription_id, deployment_name))
+    if app:
+        checkpoint.save("mrg_deployed")
+        profile = state["profiles_by_mrg"].get(
+            billing_profiles.mrg_key(subscription_id, app.managed_resource_group_id)
+        )
+        if profile:
+            if state["landing_zones"].get(profile.id):
+                return None
+            checkpoint.save("billing_profile_created", billing_profile_id=profile.id)
+
+    missing = "landing zone" if app else "MRG, billing profile and landing zone"
+    if app and not checkpoint.done("billing_profile_created"):
+        missing = "billing profile and landing zone"
+
+    return FleetAction(
+        WAVE_RESOURCES,
+        "create",
+        f"landing_zone/{deployment_name}",
+        f"missing {missing}",
+        partial(
+            lz.create_lz_e2e,
+            subscription_id,
+            landing_zone["resource_group"],
+            landing_zone["authed_user"],
+            lz.DEFINITIONS[landing_zone["definition"]],
+            location=landing_zone.get("location", "southcentralus"),
+            checkpoint=checkpoint,
+            supernet=landing_zone.get("supernet"),
+        ),
+    )
+
+
+def apply(actions: list[FleetAction], max_workers: int = 16) -> int:
+    """
+    Executes the actions wave by wave; the actions within a wave run concurrently.
+    :return: Number of failed actions
+    """
+    failures = 0
+    for wave in sorted({a.wave for a in actions}):
+        wave_actions = [a for a in actions if a.wave == wave]
+        results = run_concurrently(
+            wave_actions,
+            lambda a: a.execute(),
+            max_workers=max_workers,
+            name="Fleet action",
+            adaptive=True,
+        )
+        for result in results:
+            logging.info(
+                f"{result.item.action} {result.item.resource}: {'done' if result.succeeded else 'FAILED'} in {result.elapsed_seconds:.0f}s"
+            )
+        failures += len([r for r in results if not r.succeeded])
+    return failures
+
+
+def _render_actions(actions: list[FleetAction]):
+    if not actions:
+        logging.info("Fleet matches spec, nothing to do")
+        return
+
+    rows = [
+        {"Action": a.action, "Resource": a.resource, "Detail": a.detail}
+        for a in sorted(actions, key=lambda a: (a.wave, a.resource))
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys"))
+
+
+def _plan_cmd(args):
+    spec = load_spec(args.spec)
+    actions = plan(spec, fetch_state(spec, args.concurrency), args.prune_members)
+    _render_actions(actions)
+
+
+def _apply_cmd(args):
+    spec = load_spec(args.spec)
+    actions = plan(spec, fetch_state(spec, args.concurrency), args.prune_members)
+    _render_actions(actions)
+
+    failures = apply(actions, args.concurrency)
+    if failures:
+        logging.error(f"{failures} of {len(actions)} actions failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-u", "--user_token", required=False)
+
+    subparsers = parser.add_subparsers()
+    subparsers.required = True
+
+    for name, func in [("plan", _plan_cmd), ("apply", _apply_cmd)]:
+        subparser = subparsers.add_parser(name)
+        subparser.add_argument("-f", "--spec", required=True)
+        subparser.add_argument(
+            "-c", "--concurrency", required=False, default=16, type=int
+        )
+        subparser.add_argument(
+            "--prune_members", required=False, default=False, action="store_true"
+        )
+        subparser.set_defaults(func=func)
+
+    cli.setup_parser_terra_env_args(parser)
+    args = cli.parse_args_and_init_config(parser)
+
+    args.func(args)
@@ -0,0 +1,237 @@
+"""
+Utility for running long Terra provisioning operations through a durable local job queue.
+
+Operations are enqueued into a SQLite database, executed by a pool of workers and checkpointed per stage, so that
+a restarted worker resumes in-flight operations instead of losing them.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import Any
+
+from tabulate import tabulate
+
+import billing_project
+import lz
+from utils import cli, shard
+from utils.jobs import (
+    DEFAULT_DB_PATH,
+    Checkpoint,
+    JobQueue,
+    queue_env,
+    run_workers,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
+)
+
+
+def _create_billing_project_job(params: dict, checkpoint: Checkpoint) -> Any:
+    billing_project.create_billing_project(
+        params["billing_project_name"],
+        params["subscription_id"],
+        params["resource_group"],
+        params["users"],
+        params["tenant_id"],
+        params.get("protected_data", False),
+        params.get("location", "southcentralus"),
+        checkpoint=checkpoint,
+    )
+
+
+def _delete_billing_project_job(params: dict, checkpoint: Checkpoint) -> Any:
+    billing_project.delete_billing_project(
+        params["billing_project_name"], checkpoint=checkpoint
+    )
+
+
+def _create_lz_e2e_job(params: dict, checkpoint: Checkpoint) -> Any:
+    return lz.create_lz_e2e(
+        params["subscription_id"],
+        params["resource_group"],
+        params["authed_user"],
+        lz.DEFINITIONS[params["definition"]],
+        params.get("lz_prefix", "test"),
+        params.get("location", "southcentralus"),
+        checkpoint=checkpoint,
+    )
+
+
+JOB_HANDLERS = {
+    "create_billing_project": _create_billing_project_job,
+    "delete_billing_project": _delete_billing_project_job,
+    "create_lz_e2e": _create_lz_e2e_job,
+}
+
+
+def _queue_env(args) -> str:
+    return queue_env(args.env, args.bee)
+
+
+def _parse_manifest(manifest_file: str) -> list[tuple[str, dict]]:
+    """
+    Reads a JSONL manifest where each line is an object of the form {"kind": ..., "params": {...}}
+    """
+    entries = []
+    with open(manifest_file, mode="r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entries.append((entry["kind"], entry["params"]))
+    return entries
+
+
+def _resource_key(kind: str, params: dict) -> str:
+    """
+    The name of the resource a job operates on, used to shard manifests across machines.
+    """
+    if "billing_project_name" in params:
+        return params["billing_project_name"]
+    if "subscription_id" in params and "resource_group" in params:
+        return f"{params['subscription_id']}/{params['resource_group']}"
+    return f"{kind}:{json.dumps(params, sort_keys=True)}"
+
+
+def _enqueue_cmd(args):
+    if args.manifest:
+        entries = _parse_manifest(args.manifest)
+    elif args.kind and args.params:
+        entries = [(args.kind, json.loads(args.params))]
+    else:
+        logging.error("Must specify either a manifest or a job kind and params")
+        sys.exit(1)
+
+    for kind, _ in entries:
+        if kind not in JOB_HANDLERS:
+            logging.error(f"Job kind must be one of {list(JOB_HANDLERS)}, {kind} found")
+            sys.exit(1)
+
+    if args.shard:
+        total = len(entries)
+        entries = shard.select(entries, lambda e: _resource_key(*e), args.shard)
+        logging.info(f"Shard {args.shard} owns {len(entries)} of {total} jobs")
+
+    queue = JobQueue(args.db)
+    for kind, params in entries:
+        job_id = queue.enqueue(kind, params, _queue_env(args))
+        logging.info(f"Enqueued job [id={job_id}, kind={kind}]")
+
+
+def _work_cmd(args):
+    queue = JobQueue(args.db, lease_seconds=args.lease_seconds)
+    run_workers(
+        queue,
+        _queue_env(args),
+        JOB_HANDLERS,
+        concurrency=args.concurrency,
+        follow=args.follow,
+    )
+
+
+def _status_cmd(args):
+    queue = JobQueue(args.db)
+    if args.job_id:
+        job = queue.get(args.job_id)
+        if job is None:
+            logging.warning(f"Job {args.job_id} not found")
+            return
+        jobs = [job]
+    else:
+        jobs = queue.list(_queue_env(args), args.status)
+    jobs = shard.select(jobs, lambda j: _resource_key(j.kind, j.params), args.shard)
+
+    rows = [
+        {
+            "ID": job.id,
+            "Kind": job.kind,
+            "Status": job.status,
+            "Stage": job.stage,
+            "Attempts": job.attempts,
+            "Updated": datetime.fromtimestamp(job.updated).isoformat(
+                timespec="seconds"
+            ),
+            "Error": job.error,
+        }
+        for job in jobs
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys"))
+
+    if args.report:
+        shard.write_report(
+            args.report,
+            "jobs",
+            args.shard,
+            [
+                {
+                    "resource": _resource_key(job.kind, job.params),
+                    "status": job.status,
+                    "error": job.error,
+                    "elapsed_seconds": round(job.updated - job.created, 3),
+                }
+                for job in jobs
+            ],
+        )
+
+
+def _retry_cmd(args):
+    JobQueue(args.db).retry(args.job_id)
+    logging.info(f"Job {args.job_id} requeued")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-u", "--user_token", required=False)
+    parser.add_argument("--db", required=False, default=DEFAULT_DB_PATH)
+
+    subparsers = parser.add_subparsers()
+    subparsers.required = True
+
+    enqueue_subparser = subparsers.add_parser("enqueue")
+    enqueue_subparser.add_argument(
+        "-k", "--kind", required=False, choices=JOB_HANDLERS.keys()
+    )
+    enqueue_subparser.add_argument(
+        "-p", "--params", required=False, help="Job parameters as a JSON object"
+    )
+    enqueue_subparser.add_argument(
+        "-f", "--manifest", required=False, help="JSONL file of {kind, params} jobs"
+    )
+    enqueue_subparser.add_argument(
+        "--shard",
+        required=False,
+        type=shard.parse_shard,
+        help="Only enqueue the jobs whose resource hashes to shard i of N (i/N, 0-based)",
+    )
+    enqueue_subparser.set_defaults(func=_enqueue_cmd)
+
+    work_subparser = subparsers.add_parser("work")
+    work_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=4, type=int
+    )
+    work_subparser.add_argument(
+        "--follow", required=False, default=False, action="store_true"
+    )
+    work_subparser.add_argument(
+        "--lease_seconds", required=False, default=120, type=int
+    )
+    work_subparser.set_defaults(func=_work_cmd)
+
+    status_subparser = subparsers.add_parser("status")
+    status_subparser.add_argument("-j", "--job_id", required=False)
+    status_subparser.add_argument("-s", "--status", required=False)
+    cli.setup_parser_shard_args(status_subparser)
+    status_subparser.set_defaults(func=_status_cmd)
+
+    retry_subparser = subparsers.add_parser("retry")
+    retry_subparser.add_argument("-j", "--job_id", required=True)
+    retry_subparser.set_defaults(func=_retry_cmd)
+
+    cli.setup_parser_terra_env_args(parser)
+    args = cli.parse_args_and_init_config(parser)
+
+    args.func(args)
@@ -1,70 +1,73 @@
 """
 Utility for working with Terra Azure Landing Zones.
 """
+
 import argparse
+import hashlib
 import json
 import logging
+import os
 import random
 import string
 import sys
-import uuid
 import io
 import csv
+from datetime import datetime, timezone
 
-import requests
+from azure.core.exceptions import HttpResponseError
 from azure.mgmt.resource import ResourceManagementClient
 from tabulate import tabulate
 
-from billing_profiles import list_managed_apps, create_billing_profile
+from billing_profiles import iter_managed_apps, create_billing_profile
 from mrg import deploy_managed_application
-from utils import auth, poll, cli
+from utils import auth, http, ipam, poll, cli
 from utils.conf import Configuration
+from utils.bulk import run_concurrently
+from utils.jobs import DEFAULT_DB_PATH, Checkpoint, JobQueue, queue_env
+from utils.models import JobReport
+from utils.payloads import landing_zone_deletion_request, landing_zone_request
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
 )
 
+LZ_SNAPSHOT_DIR = os.path.expanduser("~/.terra-tools/lz-snapshots")
+
 DEFINITIONS = {
     "standard": "CromwellBaseResourcesFactory",
     "protected": "ProtectedDataResourcesFactory",
 }
 
 
-def create_landing_zone(lz_host: str, billing_profile_id: str, definition: str):
+def create_landing_zone(
+    lz_host: str,
+    billing_profile_id: str,
+    definition: str,
+    supernet: str | None = None,
+):
     """
     Creates a landing zone, calling the LZ APIs against the supplied host and
     deploying the resources into the Azure managed application from the supplied billing profile.
     :param lz_host: Hostname of the LZ API
     :param billing_profile_id: ID of the billing profile which will hold the landing zone resources
     :param definition:  Type of landing zone to deploy, must be one of DEFINITIONS
+    :param supernet: If supplied, the landing zone's VNet is allocated from this CIDR block, not overlapping any
+    other landing zone allocated from it; otherwise the default address space is used
     """
-    job_control = {"id": f"{uuid.uuid4()}"}
-    body = {
-        "landingZoneId": f"{uuid.uuid4()}",
-        "definition": definition,
-        "version": "v1",
-        "parameters": [
-            {"key": "VNET_ADDRESS_SPACE", "value": "10.1.0.0/18"},
-            {"key": "AKS_SUBNET", "value": "10.1.0.0/22"},
-            {"key": "BATCH_SUBNET", "value": "10.1.4.0/22"},
-            {"key": "POSTGRESQL_SUBNET", "value": "10.1.8.0/22"},
-            {"key": "COMPUTE_SUBNET", "value": "10.1.12.0/22"},
-            {"key": "AKS_AUTOSCALING_ENABLED", "value": "true"},
-            {"key": "AKS_AUTOSCALING_MIN", "value": "1"},
-            {"key": "AKS_AUTOSCALING_MAX", "value": "100"},
-            {"key": "AKS_MACHINE_TYPE", "value": "Standard_D4as_v5"},
-        ],
-        "billingProfileId": billing_profile_id,
-        "jobControl": job_control,
-    }
+    network_parameters = None
+    if supernet:
+        vnet = ipam.AddressAllocator(supernet).allocate(billing_profile_id)
+        logging.info(f"Allocated {vnet} for billing profile {billing_profile_id}")
+        network_parameters = ipam.landing_zone_network_parameters(vnet)
+    body = landing_zone_request(billing_profile_id, definition, network_parameters)
 
     url = f"{lz_host}/api/landingzones/v1/azure"
 
     logging.info(
-        f"Creating landing zone..[landing_zone_id={body['landingZoneId']}, job_control_id={job_control['id']}]"
+        f"Creating landing zone..[landing_zone_id={body['landingZoneId']}, job_control_id={body['jobControl']['id']}]"
     )
 
-    result = requests.post(
+    result = http.get_session().post(
         url,
         headers=auth.build_auth_headers(auth.get_gcp_token()),
         data=json.dumps(body),
@@ -79,12 +82,150 @@ def create_job_status(lz_host: str, job_id: str):
 
     url = f"{lz_host}/api/landingzones/v1/azure/create-result/{job_id}"
 
-    result = requests.get(url, headers=auth.build_auth_headers(token))
+    result = http.get_session().get(url, headers=auth.build_auth_headers(token))
     result.raise_for_status()
 
     return result.json()
 
 
+def get_job_statuses(
+    lz_host: str, job_ids: list[str], max_workers: int = 16
+) -> dict[str, JobReport | Exception]:
+    """
+    Looks up many landing zone creation jobs concurrently.
+    :return: The job report of each job id, or the error that prevented looking it up
+    """
+    results = run_concurrently(
+        job_ids,
+        lambda job_id: JobReport.from_json(create_job_status(lz_host, job_id)),
+        max_workers,
+        "Job status lookup",
+        adaptive=True,
+    )
+    return {r.item: r.error if r.error is not None else r.result for r in results}
+
+
+def wait_for_jobs(
+    lz_host: str,
+    job_ids: list[str],
+    max_workers: int = 16,
+    max_wait_time_seconds: int = 3600,
+) -> dict[str, JobReport | Exception]:
+    """
+    Polls the jobs until every one has finished. Each poll only queries the jobs that are still running or whose
+    last lookup failed, so a transient error doesn't end the wait for that job.
+    :return: The last job report of each job id, or the error of its last lookup if that failed; jobs still
+    running (or failing to look up) when max_wait_time_seconds runs out are returned as they stand
+    """
+    statuses: dict[str, JobReport | Exception] = {}
+
+    def unfinished(job_id: str) -> bool:
+        status = statuses.get(job_id)
+        return not isinstance(status, JobReport) or not status.terminal
+
+    def jobs_poller():
+        statuses.update(
+            get_job_statuses(
+                lz_host, [j for j in job_ids if unfinished(j)], max_workers
+            )
+        )
+        remaining = [j for j in job_ids if unfinished(j)]
+        return not remaining, f"{len(remaining)} of {len(job_ids)} unfinished"
+
+    try:
+        poll.poll_predicate(
+            f"{len(job_ids)} landing zone jobs",
+            max_wait_time_seconds,
+            10,
+            jobs_poller,
+        )
+    except Exception as e:
+        logging.error(e)
+    return statuses
+
+
+def list_landing_zones(lz_host: str, billing_profile_id: str) -> list[dict]:
+    """
+    Lists the landing zones deployed into the given billing profile.
+    """
+    token = auth.get_gcp_token()
+
+    url = f"{lz_host}/api/landingzones/v1/azure"
+
+    result = http.get_session().get(
+        url,
+        headers=auth.build_auth_headers(token),
+        params={"billingProfileId": billing_profile_id},
+    )
+    result.raise_for_status()
+
+    return result.json()["landingzones"]
+
+
+def delete_landing_zone(
+    lz_host: str,
+    landing_zone_id: str,
+    wait: bool = True,
+    billing_profile_id: str | None = None,
+):
+    """
+    Deletes a landing zone and, optionally, waits for the deletion job to finish.
+    :param lz_host: Hostname of the LZ API
+    :param landing_zone_id: ID of the landing zone to delete
+    :param wait: Whether to poll until the deletion job completes
+    :param billing_profile_id: Billing profile holding the landing zone; if supplied, the address space allocated
+    to it (see ipam) is freed once the deletion has completed
+    """
+    body = landing_zone_deletion_request()
+    url = f"{lz_host}/api/landingzones/v1/azure/{landing_zone_id}"
+
+    logging.info(
+        f"Deleting landing zone..[landing_zone_id={landing_zone_id}, job_control_id={body['jobControl']['id']}]"
+    )
+
+    result = http.get_session().post(
+        url,
+        headers=auth.build_auth_headers(auth.get_gcp_token()),
+        data=json.dumps(body),
+    )
+    result.raise_for_status()
+
+    if not wait:
+        return result.json()
+
+    def lz_deletion_poller():
+        status_result = http.get_session().get(
+            f"{url}/delete-result/{job_control['id']}",
+            headers=auth.build_auth_headers(auth.get_gcp_token()),
+        )
+        status_result.raise_for_status()
+        data = status_result.json()
+        job_report = JobReport.from_json(data)
+        if job_report.running:
+            return False, job_report
+        if not job_report.succeeded:
+            logging.error(data)
+            raise Exception("lz deletion failed")
+        return True, data
+
+    _, data = poll.poll_predicate(
+        f"landing zone deletion (id={landing_zone_id})",
+        1800,
+        5,
+        lz_deletion_poller,
+        history_key="lz_deletion",
+    )
+    if billing_profile_id:
+        _release_networks(billing_profile_id)
+    return data
+
+
+def _release_networks(billing_profile_id: str):
+    released = ipam.release_owner(billing_profile_id)
+    if released:
+        logging.info(f"Released {released} from billing profile {billing_profile_id}")
+
+
 def id_generator(size=6, chars=string.ascii_lowercase + string.digits):
     return "".join(random.choice(chars) for _ in range(size))
 
@@ -96,55 +237,88 @@ def create_lz_e2e(
     definition: str,
     lz_prefix: str = "test",
     location: str = "southcentralus",
+    checkpoint: Checkpoint | None = None,
+    supernet: str | None = None,
 ):
+    """
+    Creates an MRG, billing profile and landing zone in one go. When a checkpoint is supplied, stages it records
+    as done are skipped, so an interrupted run can be resumed. When a supernet is supplied, the landing zone's
+    address space is allocated from it (see create_landing_zone).
+    """
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+
     bpm_host = Configuration.get_config()["bpm_host"]
     lz_host = Configuration.get_config()["lz_host"]
-    deployment_name = f"{lz_prefix}-{id_generator()}"
+    if not checkpoint.done("named"):
+        checkpoint.save("named", deployment_name=f"{lz_prefix}-{id_generator()}")
+    deployment_name = checkpoint.get("deployment_name")
     logging.info(
         f"Creating Azure landing zone [subscription_id={subscription_id}, resource_group={resource_group}, authed_user={authed_user}, deployment_name={deployment_name}]"
     )
 
-    deploy_managed_application(
-        subscription_id,
-        deployment_name,
-        resource_group,
-        [authed_user],
-        Configuration.get_config()["plan"],
-        location,
-    )
+    if not checkpoint.done("mrg_deployed"):
+        deploy_managed_application(
+            subscription_id,
+            deployment_name,
+            resource_group,
+            [authed_user],
+            Configuration.get_config()["plan"],
+            location,
+        )
+        checkpoint.save("mrg_deployed")
 
-    def bpm_poller():
-        managed_apps = list_managed_apps(bpm_host, subscription_id)["managedApps"]
-        for app in managed_apps:
-            if app["applicationDeploymentName"] == deployment_name:
-                return True, app
-        return False, None
-
-    bpm_status, app = poll.poll_predicate("managed app creation", 120, 5, bpm_poller)
-    created_bp = create_billing_profile(
-        bpm_host,
-        subscription_id,
-        app["managedResourceGroupId"],
-        app["tenantId"],
-    )
+    if not checkpoint.done("billing_profile_created"):
+
+        def bpm_poller():
+            for app in iter_managed_apps(bpm_host, subscription_id):
+                if app.deployment_name == deployment_name:
+                    return True, app
+            return False, None
+
+        bpm_status, app = poll.poll_predicate(
+            "managed app creation",
+            120,
+            5,
+            bpm_poller,
+            history_key="managed_app_registration",
+        )
+        created_bp = create_billing_profile(
+            bpm_host,
+            subscription_id,
+            app.managed_resource_group_id,
+            app.tenant_id,
+        )
+        checkpoint.save("billing_profile_created", billing_profile_id=created_bp["id"])
 
-    lz_create_result = create_landing_zone(lz_host, created_bp["id"], definition)
+    if not checkpoint.done("lz_requested"):
+        lz_create_result = create_landing_zone(
+            lz_host, checkpoint.get("billing_profile_id"), definition, supernet
+        )
+        checkpoint.save("lz_requested", job_id=lz_create_result["jobReport"]["id"])
 
-    job_id = lz_create_result["jobReport"]["id"]
+    job_id = checkpoint.get("job_id")
 
     def lz_poller():
         result = create_job_status(lz_host, job_id)
-        if result["jobReport"]["status"] == "RUNNING":
-            return False, None
-        if result["jobReport"]["status"] != "SUCCEEDED":
+        job_report = JobReport.from_json(result)
+        if job_report.running:
+            return False, job_report
+        if not job_report.succeeded:
             logging.error(result)
             raise Exception("lz creation failed")
-        if result["jobReport"]["status"] == "SUCCEEDED":
-            return True, result
+        return True, result
 
-    poll.poll_predicate("landing zone creation", 1200, 5, lz_poller)
+    poll.poll_predicate(
+        "landing zone creation", 1200, 5, lz_poller, history_key="lz_creation"
+    )
 
     logging.info(f"Created landing zone")
+    return {
+        "deployment_name": deployment_name,
+        "billing_profile_id": checkpoint.get("billing_profile_id"),
+        "job_id": job_id,
+    }
 
 
 def inspect_lz(subscription_id: str, managed_resource_group_id: str):
@@ -160,7 +334,9 @@ def inspect_lz(subscription_id: str, managed_resource_group_id: str):
         f"Inspecting lz at coordinates [subscription_id={subscription_id}, managed_resource_group_id={managed_resource_group_id}]"
     )
     cred = auth.get_azure_credential()
-    resource_client = ResourceManagementClient(cred, subscription_id)
+    resource_client = ResourceManagementClient(
+        cred, subscription_id, transport=http.azure_transport()
+    )
 
     resource_list = resource_client.resources.list_by_resource_group(
         managed_resource_group_id, expand="createdTime,changedTime"
@@ -168,6 +344,140 @@ def inspect_lz(subscription_id: str, managed_resource_group_id: str):
     return resource_list
 
 
+def inspect_lz_changes(
+    subscription_id: str,
+    managed_resource_group_id: str,
+    since: datetime | None = None,
+    snapshot_dir: str | None = LZ_SNAPSHOT_DIR,
+    full: bool = False,
+) -> dict[str, list[dict]]:
+    """
+    Reports the resources added, removed and changed in a landing zone since the last inspection (or since the
+    supplied time). Asks ARM to filter on changedTime so that only changed resources are fetched with their
+    details, and falls back to a full listing diffed locally when the filter isn't supported. Removals only show
+    up in the full listing, so they are reported (and dropped from the snapshot) when full is set or the filter
+    isn't supported.
+    :param subscription_id: Subscription in which the landing zone resides
+    :param managed_resource_group_id: Managed resource group containing the Terra deployment
+    :param since: Report changes after this time; defaults to the time of the stored snapshot
+    :param snapshot_dir: Where inspection snapshots are kept, or None to not use snapshots
+    :param full: List every resource instead of only the changed ones, to find removals
+    :return: Dict of "added", "removed" and "changed" resource lists
+    """
+    # resource group ids may be full ARM ids, which aren't usable as file names
+    snapshot_key = hashlib.sha256(
+        f"{subscription_id}/{managed_resource_group_id}".encode("utf-8")
+    ).hexdigest()
+    snapshot_path = (
+        os.path.join(snapshot_dir, f"{snapshot_key}.json") if snapshot_dir else None
+    )
+    snapshot = None
+    if snapshot_path and os.path.exists(snapshot_path):
+        with open(snapshot_path, mode="r") as f:
+            snapshot = json.load(f)
+    if since is None and snapshot:
+        since = datetime.fromisoformat(snapshot["taken_at"])
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    taken_at = datetime.now(timezone.utc)
+    resources = ResourceManagementClient(
+        auth.get_azure_credential(), subscription_id, transport=http.azure_transport()
+    ).resources
+    previous = snapshot["resources"] if snapshot else {}
+
+    changed = None
+    # a first snapshot needs the full listing, so the filtered fetch is only used when there is one to update
+    if not full and since is not None and (snapshot or not snapshot_path):
+        try:
+            changed = [
+                _resource_summary(r)
+                for r in resources.list_by_resource_group(
+                    managed_resource_group_id,
+                    filter=f"changedTime ge '{since.isoformat()}'",
+                    expand="createdTime,changedTime",
+                )
+            ]
+        except HttpResponseError as e:
+            logging.info(
+                f"changedTime filter not supported ({e.status_code}), diffing full listing instead"
+            )
+
+    if changed is None:
+        listed = [
+            _resource_summary(r)
+            for r in resources.list_by_resource_group(
+                managed_resource_group_id, expand="createdTime,changedTime"
+            )
+        ]
+        current_ids = {r["id"] for r in listed}
+        changed = [
+            r
+            for r in listed
+            if since is None
+            or (
+                r["changed_time"] and datetime.fromisoformat(r["changed_time"]) >= since
+            )
+        ]
+    else:
+        # without a full listing, resources not known to be changed are assumed to still exist
+        current_ids = set(previous) | {r["id"] for r in changed}
+
+    if snapshot_path:
+        current = {id: previous[id] for id in current_ids if id in previous}
+        current.update({r["id"]: r for r in changed})
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        with open(snapshot_path, mode="w") as f:
+            json.dump({"taken_at": taken_at.isoformat(), "resources": current}, f)
+
+    if not snapshot and since is not None:
+        # nothing to compare against, so we can't tell additions from changes
+        return {"added": [], "changed": changed, "removed": []}
+
+    return {
+        "added": [r for r in changed if r["id"] not in previous],
+        "changed": [r for r in changed if r["id"] in previous],
+        "removed": [r for id, r in previous.items() if id not in current_ids],
+    }
+
+
+def _resource_summary(resource) -> dict:
+    return {
+        "id": resource.id,
+        "name": resource.name,
+        "type": resource.type,
+        "created_time": (
+            resource.created_time.isoformat() if resource.created_time else None
+        ),
+        "changed_time": (
+            resource.changed_time.isoformat() if resource.changed_time else None
+        ),
+    }
+
+
+def _render_resource_changes(changes: dict[str, list[dict]], output_format="csv"):
+    objs = [
+        {
+            "Change": change,
+            "Name": r["name"],
+            "Type": r["type"],
+            "Changed Time": r["changed_time"],
+        }
+        for change, resources in changes.items()
+        for r in resources
+    ]
+    if not objs:
+        logging.info("No changes")
+    elif "pretty" == output_format:
+        logging.info(tabulate(objs, headers="keys"))
+    else:
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=objs[0].keys())
+        writer.writeheader()
+        writer.writerows(objs)
+        logging.info(output.getvalue())
+
+
 def _render_resource_list(resource_list: list, output_format="csv"):
     objs = [
         {"Name": r.name, "Type": r.type, "Created Time": r.created_time}
@@ -184,12 +494,75 @@ def _render_resource_list(resource_list: list, output_format="csv"):
 
 
 def _inspect_cmd(args):
+    if args.since or args.snapshot:
+        changes = inspect_lz_changes(
+            args.subscription_id,
+            args.managed_resource_group_id,
+            datetime.fromisoformat(args.since) if args.since else None,
+            LZ_SNAPSHOT_DIR if args.snapshot else None,
+            args.full,
+        )
+        _render_resource_changes(changes, args.output_format)
+        return
+
     resources = inspect_lz(args.subscription_id, args.managed_resource_group_id)
     _render_resource_list(resources, args.output_format)
 
 
 def _create_job_status_cmd(args):
-    create_job_status(Configuration.get_config()["lz_host"], args.job_id)
+    result = create_job_status(Configuration.get_config()["lz_host"], args.job_id)
+    logging.info(json.dumps(result, indent=4))
+
+
+def _job_status_cmd(args):
+    job_ids = list(args.job_ids or [])
+    if args.job_ids_file:
+        with open(args.job_ids_file, mode="r") as f:
+            job_ids.extend(line.strip() for line in f if line.strip())
+    if args.journal:
+        # landing zone jobs run through jobs.py record the LZ job id in their checkpoint state
+        queue = JobQueue(args.db)
+        job_ids.extend(
+            job.state["job_id"]
+            for job in queue.list(queue_env(args.env, args.bee))
+            if job.kind == "create_lz_e2e" and job.state.get("job_id")
+        )
+    job_ids = list(dict.fromkeys(job_ids))
+    if not job_ids:
+        logging.error("Must specify job ids, a job ids file or --journal")
+        sys.exit(1)
+
+    if args.output_format == "jsonl":
+        cli.log_to_stderr()
+
+    lz_host = Configuration.get_config()["lz_host"]
+    if args.wait:
+        statuses = wait_for_jobs(lz_host, job_ids, args.concurrency)
+    else:
+        statuses = get_job_statuses(lz_host, job_ids, args.concurrency)
+
+    rows = [
+        (
+            {
+                "job_id": job_id,
+                "status": status.status,
+                "submitted": status.submitted,
+                "completed": status.completed,
+                "error": status.error,
+            }
+            if isinstance(status, JobReport)
+            else {"job_id": job_id, "status": "LOOKUP_FAILED", "error": f"{status}"}
+        )
+        for job_id, status in statuses.items()
+    ]
+    if args.output_format == "jsonl":
+        for row in rows:
+            sys.stdout.write(json.dumps(row) + "\n")
+    else:
+        logging.info("\n" + tabulate(rows, headers="keys"))
+
+    if any(row["status"] != "SUCCEEDED" for row in rows) and args.wait:
+        sys.exit(1)
 
 
 def _lz_create_cmd(args):
@@ -199,6 +572,7 @@ def _lz_create_cmd(args):
         Configuration.get_config()["lz_host"],
         args.billing_profile_id,
         DEFINITIONS[args.definition],
+        args.supernet,
     )
 
 
@@ -211,9 +585,27 @@ def _e2e_cmd(args):
         DEFINITIONS[args.definition],
         args.lz_prefix,
         args.location,
+        supernet=args.supernet,
     )
 
 
+def _networks_cmd(args):
+    allocator = ipam.AddressAllocator(args.supernet)
+    if args.release:
+        released = allocator.release(args.release)
+        logging.info(
+            f"Released {released} from {args.release}"
+            if released
+            else f"{args.release} has no allocation in {args.supernet}"
+        )
+        return
+
+    rows = [
+        {"CIDR": cidr, "Billing Profile": owner} for cidr, owner in allocator.list()
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys"))
+
+
 def _verify_lz_definition(definition: str):
     if definition not in DEFINITIONS:
         logging.info(
@@ -233,11 +625,45 @@ if __name__ == "__main__":
     create_subparser.set_defaults(func=_lz_create_cmd)
     create_subparser.add_argument("-b", "--billing_profile_id", required=True)
     create_subparser.add_argument("-d", "--definition", required=True)
+    create_subparser.add_argument(
+        "--supernet",
+        required=False,
+        help="Allocate a non-overlapping VNet address space for the landing zone from this CIDR block",
+    )
 
     create_job_status_subparser = subparsers.add_parser("create_job_status")
     create_job_status_subparser.set_defaults(func=_create_job_status_cmd)
     create_job_status_subparser.add_argument("-j", "--job_id")
 
+    job_status_subparser = subparsers.add_parser("job_status")
+    job_status_subparser.add_argument("-j", "--job_ids", nargs="+")
+    job_status_subparser.add_argument(
+        "-f", "--job_ids_file", required=False, help="File with one job id per line"
+    )
+    job_status_subparser.add_argument(
+        "--journal",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Include the LZ jobs of create_lz_e2e jobs run through jobs.py",
+    )
+    job_status_subparser.add_argument("--db", required=False, default=DEFAULT_DB_PATH)
+    job_status_subparser.add_argument(
+        "-o", "--output_format", choices=["table", "jsonl"], default="table"
+    )
+    job_status_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=16, type=int
+    )
+    job_status_subparser.add_argument(
+        "-w",
+        "--wait",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Wait until every job has finished; exits non-zero unless all succeeded",
+    )
+    job_status_subparser.set_defaults(func=_job_status_cmd)
+
     e2e_subparser = subparsers.add_parser("e2e")
     e2e_subparser.add_argument("-s", "--subscription_id", required=True)
     e2e_subparser.add_argument("-r", "--resource_group", required=True)
@@ -247,14 +673,49 @@ if __name__ == "__main__":
     e2e_subparser.add_argument(
         "-l", "--location", required=False, default="southcentralus"
     )
+    e2e_subparser.add_argument(
+        "--supernet",
+        required=False,
+        help="Allocate a non-overlapping VNet address space for the landing zone from this CIDR block",
+    )
     e2e_subparser.set_defaults(func=_e2e_cmd)
 
+    networks_subparser = subparsers.add_parser("networks")
+    networks_subparser.add_argument(
+        "--supernet", required=False, default=ipam.DEFAULT_SUPERNET
+    )
+    networks_subparser.add_argument(
+        "--release",
+        required=False,
+        help="Free the address space allocated to this billing profile",
+    )
+    networks_subparser.set_defaults(func=_networks_cmd)
+
     inspect_subparser = subparsers.add_parser("inspect")
     inspect_subparser.add_argument("-s", "--subscription_id", required=True)
     inspect_subparser.add_argument("-m", "--managed_resource_group_id", required=True)
     inspect_subparser.add_argument(
         "-o", "--output_format", default="pretty", required=False
     )
+    inspect_subparser.add_argument(
+        "--since",
+        required=False,
+        help="Only report resources changed after this ISO 8601 time",
+    )
+    inspect_subparser.add_argument(
+        "--snapshot",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Diff against, and then update, the locally stored snapshot of the last inspection",
+    )
+    inspect_subparser.add_argument(
+        "--full",
+        required=False,
+        default=False,
+        action="store_true",
+        help="With --since or --snapshot, list every resource so that removed ones are reported too",
+    )
     inspect_subparser.set_defaults(func=_inspect_cmd)
 
     cli.setup_parser_terra_env_args(parser)
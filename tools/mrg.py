@@ -7,19 +7,23 @@ import json
 import logging
 import sys
 
-import requests
+from azure.mgmt.resource import ResourceManagementClient
 
-from utils import auth, poll, cli
+from utils import arm, auth, http, poll, cli
 from utils.conf import Configuration
+from utils.models import ArmResource
+from utils.payloads import (
+    MRG_FAILED_STATES,
+    MRG_NOT_READY_STATES,
+    MRG_READY_STATES,
+    managed_application_request,
+    managed_application_url,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
 )
 
-MRG_NOT_READY_STATES = ["Accepted", "Creating"]
-MRG_FAILED_STATES = ["Failed", "Deleted", "Deleting"]
-MRG_READY_STATES = ["Succeeded", "Running", "Ready"]
-
 
 def deploy_managed_application(
     subscription_id: str,
@@ -30,20 +34,13 @@ def deploy_managed_application(
     location: str = "southcentralus",
 ):
     access_token = auth.get_azure_access_token()
-    body = {
-        "location": location,
-        "plan": plan,
-        "kind": "MarketPlace",
-        "properties": {
-            "managedResourceGroupId": f"/subscriptions/{subscription_id}/resourceGroups/{deployment_name}",
-            "parameters": {
-                "authorizedTerraUser": {"value": ",".join(authorized_terra_users)},
-                "location": {"value": location},
-            },
-        },
-    }
+    body = managed_application_request(
+        subscription_id, deployment_name, authorized_terra_users, plan, location
+    )
 
-    url = f"https://management.azure.com/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Solutions/applications/{deployment_name}?api-version=2018-06-01"
+    url = managed_application_url(
+        subscription_id, resource_group, deployment_name, "2018-06-01"
+    )
     headers = {
         "content-type": "application/json",
         "Authorization": f"Bearer {access_token.token}",
@@ -52,35 +49,52 @@ def deploy_managed_application(
     logging.info(
         f"Creating MRG [subscription={subscription_id}, resource_group={resource_group}, users={authorized_terra_users}]"
     )
-    result = requests.put(url, headers=headers, data=json.dumps(body))
+    result = http.get_session().put(url, headers=headers, data=json.dumps(body))
     result.raise_for_status()
 
     def app_state_poller():
-        check_url = f"https://management.azure.com/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Solutions/applications/{deployment_name}?api-version=2018-06-01"
-        app_result = requests.get(check_url, headers=headers)
+        app_result = arm.get_shared_batcher().get(url)
         app_result.raise_for_status()
-        data = app_result.json()
+        app = ArmResource.from_json(app_result.body)
 
-        provisioning_state = data["properties"]["provisioningState"]
+        provisioning_state = app.provisioning_state
         if provisioning_state in MRG_NOT_READY_STATES:
-            return False, data
+            return False, app
         elif provisioning_state in MRG_FAILED_STATES:
-            raise Exception(f"MRG creation failed => {data}")
+            raise Exception(f"MRG creation failed => {app_result.body}")
         elif provisioning_state in MRG_READY_STATES:
-            return True, data
+            return True, app
         else:
             raise Exception(f"Unknown MRG state => {provisioning_state}")
 
-    poll.poll_predicate("MRG creation", 300, 5, app_state_poller)
+    if arm.has_async_operation(result):
+        arm.wait_for_async_operation(
+            "MRG creation", result, 300, history_key="mrg_creation"
+        )
+    else:
+        poll.poll_predicate(
+            "MRG creation", 300, 5, app_state_poller, history_key="mrg_creation"
+        )
 
     return result.json()
 
 
 def delete_managed_application(
-    subscription_id: str, deployment_name: str, resource_group: str
+    subscription_id: str,
+    deployment_name: str,
+    resource_group: str,
+    wait: bool = False,
+    max_wait_time_seconds: int = 3600,
 ):
+    """
+    Deletes the managed application. ARM deletes the application asynchronously; when wait is set, the ARM
+    async operation is followed until the application and its managed resource group are gone, or, if ARM
+    doesn't return one, the application is polled until it is no longer found.
+    """
     access_token = auth.get_azure_access_token()
-    url = f"https://management.azure.com/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Solutions/applications/{deployment_name}?api-version=2019-07-01"
+    url = managed_application_url(
+        subscription_id, resource_group, deployment_name, "2019-07-01"
+    )
     headers = {
         "content-type": "application/json",
         "Authorization": f"Bearer {access_token.token}",
@@ -89,15 +103,62 @@ def delete_managed_application(
         f"Deleting MRG [subscription={subscription_id}, resource_group={resource_group}, deployment_name={deployment_name}]"
     )
 
-    result = requests.delete(url, headers=headers)
+    result = http.get_session().delete(url, headers=headers)
     result.raise_for_status()
 
+    if result.status_code == 204:
+        logging.info("MRG not found, nothing to delete")
+        return
+
+    if not wait:
+        logging.info("Deletion started")
+        return
+
+    name = f"MRG deletion (deployment_name={deployment_name})"
+    if arm.has_async_operation(result):
+        arm.wait_for_async_operation(
+            name, result, max_wait_time_seconds, history_key="mrg_deletion"
+        )
+    elif result.status_code != 200:
+        # accepted without an operation to follow, so wait for the application itself to disappear
+        def deletion_poller():
+            response = http.get_session().get(
+                url,
+                headers=auth.build_auth_headers(auth.get_azure_access_token().token),
+            )
+            if response.status_code == 404:
+                return True, None
+            response.raise_for_status()
+            return False, response.json().get("properties", {}).get("provisioningState")
+
+        poll.poll_predicate(
+            name, max_wait_time_seconds, 10, deletion_poller, history_key="mrg_deletion"
+        )
     logging.info("Deletion complete")
 
 
+def list_managed_applications(subscription_id: str) -> list[ArmResource]:
+    """
+    Lists the managed applications in the subscription, including their creation time. Uses the default azure
+    credential from the environment.
+    :param subscription_id: Subscription to list
+    :return: List of the managed applications
+    """
+    resource_client = ResourceManagementClient(
+        auth.get_azure_credential(), subscription_id, transport=http.azure_transport()
+    )
+    return [
+        ArmResource.from_sdk(resource)
+        for resource in resource_client.resources.list(
+            filter="resourceType eq 'Microsoft.Solutions/applications'",
+            expand="createdTime",
+        )
+    ]
+
+
 def _delete_mrg_cmd(args):
     delete_managed_application(
-        args.subscription_id, args.deployment_name, args.resource_group
+        args.subscription_id, args.deployment_name, args.resource_group, args.wait
     )
 
 
@@ -132,6 +193,9 @@ if __name__ == "__main__":
     delete_subparser.add_argument("-d", "--deployment_name", required=True)
     delete_subparser.add_argument("-s", "--subscription_id", required=True)
     delete_subparser.add_argument("-r", "--resource_group", required=True)
+    delete_subparser.add_argument(
+        "-w", "--wait", required=False, default=False, action="store_true"
+    )
     delete_subparser.set_defaults(func=_delete_mrg_cmd)
 
     cli.setup_parser_terra_env_args(parser)
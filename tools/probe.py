@@ -0,0 +1,299 @@
+"""
+Utility for measuring how the Terra services of one or more environments are performing before a big batch.
+
+Sends a steady rate of lightweight read requests (by default each service's /version endpoint) to the Rawls, BPM
+and LZ hosts of each environment, all probed concurrently, and reports latency percentiles, error rates and the
+cost of setting up a new connection (the latency of requests on fresh connections over that of pooled ones).
+Requests are sent open-loop: they go out on schedule however slowly earlier ones return, so a service that can't
+keep up shows up as rising latency and errors rather than as a lower request rate. Requests are not retried.
+
+    python probe.py -e dev --envs dev staging -r 5 -d 30
+"""
+
+import argparse
+import logging
+import math
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import requests
+from tabulate import tabulate
+
+from utils import auth, cli
+from utils.bulk import run_concurrently
+from utils.conf import Configuration, TerraEnvs
+from utils.http import get_session_with_retry
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
+)
+
+SERVICES = {"rawls": "rawls_host", "bpm": "bpm_host", "lz": "lz_host"}
+DEFAULT_PATH = "/version"
+
+
+@dataclass
+class ProbeTarget:
+    env: str
+    service: str
+    url: str
+
+
+@dataclass
+class ProbeResult:
+    target: ProbeTarget
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    cold_latencies: list[float] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, status: str, latency: float):
+        with self._lock:
+            self.statuses[status] += 1
+            if status.isdigit():
+                self.latencies.append(latency)
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(n for status, n in self.statuses.items() if not _succeeded(status))
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Nearest-rank percentile of the latencies of the requests that got a response.
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    @property
+    def connection_setup_seconds(self) -> Optional[float]:
+        if not self.cold_latencies or not self.latencies:
+            return None
+        return max(
+            0.0,
+            statistics.median(self.cold_latencies) - statistics.median(self.latencies),
+        )
+
+
+def probe_targets(
+    envs: list[str], services: list[str], path: str, bee: Optional[str] = None
+) -> list[ProbeTarget]:
+    targets = []
+    for env in envs:
+        config = Configuration.get_config_for_env(
+            TerraEnvs(env), {"bee": bee} if bee else {}
+        )
+        for service in services:
+            targets.append(
+                ProbeTarget(env, service, f"{config[SERVICES[service]]}{path}")
+            )
+    return targets
+
+
+def probe(
+    target: ProbeTarget,
+    rate: float,
+    duration_seconds: float,
+    max_in_flight: int = 32,
+    cold_samples: int = 5,
+    headers: Optional[dict] = None,
+) -> ProbeResult:
+    """
+    Sends rate requests per second to the target for duration_seconds over pooled connections, after timing
+    cold_samples requests that each open a new connection.
+    :param max_in_flight: Cap on outstanding requests. Requests beyond it wait for a free slot, and their latency
+    is measured from when they were due to be sent, so that waiting counts against the target
+    """
+    if rate <= 0:
+        raise ValueError(f"Rate must be greater than 0, {rate} found")
+    result = ProbeResult(target)
+
+    for _ in range(cold_samples):
+        with get_session_with_retry(pool_size=1, retry=False) as session:
+            _timed_get(session, target.url, headers, result, cold=True)
+
+    session = get_session_with_retry(pool_size=max_in_flight, retry=False)
+    try:
+        # open the pooled connection before measuring
+        session.get(target.url, headers=headers, timeout=30)
+    except requests.RequestException:
+        pass
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for n in range(max(1, int(rate * duration_seconds))):
+            scheduled = start + n / rate
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(
+                _timed_get, session, target.url, headers, result, scheduled=scheduled
+            )
+    result.elapsed_seconds = time.monotonic() - start
+    return result
+
+
+def _timed_get(
+    session: requests.Session,
+    url: str,
+    headers: Optional[dict],
+    result: ProbeResult,
+    cold: bool = False,
+    scheduled: Optional[float] = None,
+):
+    """
+    :param scheduled: The time.monotonic() the request was due to be sent; latency is measured from then rather
+    than from when a worker got to it, so time spent queued behind a saturated target isn't left out
+    """
+    start = time.monotonic() if scheduled is None else scheduled
+    try:
+        response = session.get(url, headers=headers, timeout=30)
+        response.content
+        status = f"{response.status_code}"
+    except requests.RequestException as e:
+        status = type(e).__name__
+    latency = time.monotonic() - start
+
+    if cold:
+        if _succeeded(status):
+            result.cold_latencies.append(latency)
+        return
+    result.add(status, latency)
+
+
+def _succeeded(status: str) -> bool:
+    return status.isdigit() and int(status) < 400
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else seconds * 1000
+
+
+def _render_results(results: list[ProbeResult]):
+    rows = [
+        {
+            "Env": r.target.env,
+            "Service": r.target.service,
+            "Requests": r.requests,
+            "Req/s": r.requests / r.elapsed_seconds if r.elapsed_seconds else None,
+            "Error %": 100 * r.errors / r.requests if r.requests else None,
+            "p50 ms": _ms(r.percentile(50)),
+            "p95 ms": _ms(r.percentile(95)),
+            "p99 ms": _ms(r.percentile(99)),
+            "Max ms": _ms(max(r.latencies, default=None)),
+            "Conn setup ms": _ms(r.connection_setup_seconds),
+            "Statuses": ", ".join(f"{s}: {n}" for s, n in sorted(r.statuses.items())),
+        }
+        for r in results
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys", floatfmt=".1f"))
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Must be greater than 0, {value} found")
+    return number
+
+
+def _probe_cmd(args):
+    targets = probe_targets(args.envs or [args.env], args.services, args.path, args.bee)
+    headers = (
+        auth.build_auth_headers(auth.get_gcp_token()) if args.authenticated else None
+    )
+    logging.info(
+        f"Probing {len(targets)} endpoints at {args.rate} req/s each for {args.duration:.0f}s"
+    )
+
+    results = run_concurrently(
+        targets,
+        lambda t: probe(
+            t, args.rate, args.duration, args.max_in_flight, args.cold_samples, headers
+        ),
+        max_workers=len(targets),
+        name="Probe",
+    )
+    _render_results([r.result for r in results if r.succeeded])
+    if not all(r.succeeded for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-u", "--user_token", required=False)
+    parser.add_argument(
+        "--envs",
+        nargs="+",
+        required=False,
+        choices=Configuration.get_environments(),
+        type=str.lower,
+        help="Environments to probe concurrently; defaults to --env",
+    )
+    parser.add_argument(
+        "-s",
+        "--services",
+        nargs="+",
+        required=False,
+        choices=SERVICES.keys(),
+        default=list(SERVICES),
+    )
+    parser.add_argument(
+        "-p",
+        "--path",
+        required=False,
+        default=DEFAULT_PATH,
+        help="Path to request on every host",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        required=False,
+        default=2.0,
+        type=_positive_float,
+        help="Requests per second to each host",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        required=False,
+        default=30.0,
+        type=float,
+        help="Seconds to probe for",
+    )
+    parser.add_argument("--max_in_flight", required=False, default=32, type=int)
+    parser.add_argument(
+        "--cold_samples",
+        required=False,
+        default=5,
+        type=int,
+        help="Requests on fresh connections per host, to measure connection setup",
+    )
+    parser.add_argument(
+        "--authenticated",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Send a Terra access token, for probing paths that need one",
+    )
+    parser.set_defaults(func=_probe_cmd)
+
+    cli.setup_parser_terra_env_args(parser)
+    args = cli.parse_args_and_init_config(parser)
+    if args.envs and TerraEnvs.BEE in args.envs and args.bee is None:
+        parser.error("BEE name is required when probing BEE")
+
+    args.func(args)
@@ -0,0 +1,71 @@
+"""
+Utility for combining the per-shard reports of a bulk command run across several machines with `--shard i/N`.
+
+Each shard writes its own report with `--report`; `merge` checks that every shard of the run reported, writes one
+combined report and summarizes the results per shard.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from collections import Counter
+
+from tabulate import tabulate
+
+from utils.shard import merge_reports
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
+)
+
+
+def _merge_cmd(args):
+    try:
+        merged = merge_reports(args.reports)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+    if args.output_file:
+        with open(args.output_file, mode="w") as f:
+            json.dump(merged, f, indent=2)
+
+    counts: dict[str, Counter] = {}
+    for result in merged["results"]:
+        counts.setdefault(result["shard"], Counter())[result["status"]] += 1
+    statuses = sorted({status for c in counts.values() for status in c})
+    rows = [
+        {"Shard": name, **{status: c[status] for status in statuses}}
+        for name, c in sorted(counts.items(), key=lambda kv: int(kv[0].split("/")[0]))
+    ]
+    logging.info(
+        f"{merged['command']} across {merged['shards']} shards\n"
+        + tabulate(rows, headers="keys")
+    )
+
+    failed = [r for r in merged["results"] if r["status"] == "failed"]
+    for result in failed:
+        logging.error(
+            f"{result['resource']} (shard {result['shard']}) failed => {result['error']}"
+        )
+    if merged["missing_shards"]:
+        logging.error(f"No report from shards {merged['missing_shards']}")
+    if failed or merged["missing_shards"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    subparsers = parser.add_subparsers()
+    subparsers.required = True
+
+    merge_subparser = subparsers.add_parser("merge")
+    merge_subparser.add_argument(
+        "-i", "--reports", nargs="+", required=True, help="Per-shard report files"
+    )
+    merge_subparser.add_argument("-o", "--output_file", required=False)
+    merge_subparser.set_defaults(func=_merge_cmd)
+
+    args = parser.parse_args()
+    args.func(args)
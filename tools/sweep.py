@@ -0,0 +1,358 @@
+"""
+Utility for sweeping stale test managed applications and everything deployed on top of them.
+
+Finds managed applications matching a name prefix that are older than a cutoff, builds a dependency-ordered
+teardown plan for each (workspaces -> billing project, or landing zones -> billing profile, then the MRG itself)
+and executes the plans in parallel.
+"""
+
+import argparse
+import logging
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Callable, Optional
+
+from tabulate import tabulate
+
+import billing_profiles
+import billing_project
+import lz
+import mrg
+import workspace
+from utils import cli, ipam, shard
+from utils.bulk import BulkResult, run_concurrently
+from utils.conf import Configuration
+from utils.http import get_session_with_retry
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
+)
+
+# shorter prefixes match too much of a subscription to be a safe selector for deletion
+MIN_PREFIX_LENGTH = 3
+
+
+@dataclass
+class StaleApplication:
+    subscription_id: str
+    resource_group: str
+    deployment_name: str
+    created_time: datetime
+
+
+@dataclass
+class TeardownStep:
+    kind: str
+    target: str
+    action: Callable[[], Any]
+
+
+@dataclass
+class TeardownPlan:
+    app: StaleApplication
+    stages: list[list[TeardownStep]] = field(default_factory=list)
+    # set when the plan couldn't be built safely; such plans are reported as failed without deleting anything
+    error: Optional[str] = None
+
+
+class SweepException(Exception):
+    pass
+
+
+def find_stale_applications(
+    subscription_ids: list[str], prefix: str, older_than: timedelta
+) -> list[StaleApplication]:
+    """
+    Lists managed applications across the subscriptions concurrently and keeps those whose name starts with the
+    prefix and which were created before the cutoff.
+    """
+    if len(prefix) < MIN_PREFIX_LENGTH:
+        raise SweepException(
+            f"Prefix must be at least {MIN_PREFIX_LENGTH} characters, '{prefix}' found"
+        )
+    cutoff = datetime.now(timezone.utc) - older_than
+    listings = run_concurrently(
+        subscription_ids, mrg.list_managed_applications, name="Managed app listing"
+    )
+
+    stale = []
+    for listing in listings:
+        if not listing.succeeded:
+            raise SweepException(
+                f"Unable to list managed apps in {listing.item} => {listing.error}"
+            )
+        for app in listing.result:
+            if not app.name.startswith(prefix):
+                continue
+            if app.created_time is None or app.created_time > cutoff:
+                continue
+            stale.append(
+                StaleApplication(
+                    subscription_id=listing.item,
+                    resource_group=app.resource_group,
+                    deployment_name=app.name,
+                    created_time=app.created_time,
+                )
+            )
+    return stale
+
+
+def build_teardown_plans(apps: list[StaleApplication]) -> list[TeardownPlan]:
+    """
+    Builds a teardown plan per application. Billing projects, workspaces and billing profiles are each fetched
+    once and indexed by managed resource group; landing zones are looked up concurrently for the billing profiles
+    that are not owned by a rawls billing project (rawls tears those down itself).
+    """
+    config = Configuration.get_config()
+    session = get_session_with_retry()
+
+    projects_by_mrg = {}
+    for project in billing_project.get_billing_projects():
+        if project.subscription_id and project.managed_resource_group_id:
+            key = billing_profiles.mrg_key(
+                project.subscription_id, project.managed_resource_group_id
+            )
+            projects_by_mrg[key] = project.project_name
+
+    workspaces_by_project: dict[str, list[str]] = {}
+    for w in workspace.list_workspaces(session):
+        workspaces_by_project.setdefault(w.namespace, []).append(w.name)
+
+    profiles_by_mrg = {
+        billing_profiles.mrg_key(p.subscription_id, p.managed_resource_group_id): p.id
+        for p in billing_profiles.list_billing_profiles(config["bpm_host"])
+        if p.subscription_id and p.managed_resource_group_id
+    }
+
+    unowned_profiles = [
+        profiles_by_mrg[key]
+        for key in (
+            billing_profiles.mrg_key(a.subscription_id, a.deployment_name) for a in apps
+        )
+        if key in profiles_by_mrg and key not in projects_by_mrg
+    ]
+    lz_listings = run_concurrently(
+        unowned_profiles,
+        lambda profile_id: lz.list_landing_zones(config["lz_host"], profile_id),
+        name="Landing zone listing",
+    )
+    lzs_by_profile = {
+        listing.item: [z["landingZoneId"] for z in listing.result]
+        for listing in lz_listings
+        if listing.succeeded
+    }
+    unlisted_profiles = {
+        listing.item for listing in lz_listings if not listing.succeeded
+    }
+
+    plans = []
+    for app in apps:
+        key = billing_profiles.mrg_key(app.subscription_id, app.deployment_name)
+        plan = TeardownPlan(app)
+
+        project_name = projects_by_mrg.get(key)
+        profile_id = profiles_by_mrg.get(key)
+        if project_name:
+            plan.stages.append(
+                [
+                    _workspace_step(project_name, workspace_name)
+                    for workspace_name in workspaces_by_project.get(project_name, [])
+                ]
+            )
+            plan.stages.append(
+                [
+                    TeardownStep(
+                        "billing_project",
+                        project_name,
+                        partial(billing_project.delete_billing_project, project_name),
+                    )
+                ]
+            )
+        elif profile_id in unlisted_profiles:
+            # without the landing zones, deleting the profile and MRG would orphan them
+            plan.error = (
+                f"Unable to list the landing zones of billing profile {profile_id}"
+            )
+            logging.error(f"Skipping teardown of {app.deployment_name}: {plan.error}")
+            plans.append(plan)
+            continue
+        elif profile_id:
+            plan.stages.append(
+                [
+                    TeardownStep(
+                        "landing_zone",
+                        lz_id,
+                        partial(
+                            lz.delete_landing_zone,
+                            config["lz_host"],
+                            lz_id,
+                            billing_profile_id=profile_id,
+                        ),
+                    )
+                    for lz_id in lzs_by_profile.get(profile_id, [])
+                ]
+            )
+            plan.stages.append(
+                [
+                    TeardownStep(
+                        "billing_profile",
+                        profile_id,
+                        partial(
+                            _delete_billing_profile, config["bpm_host"], profile_id
+                        ),
+                    )
+                ]
+            )
+
+        plan.stages.append(
+            [
+                TeardownStep(
+                    "mrg",
+                    app.deployment_name,
+                    partial(
+                        mrg.delete_managed_application,
+                        app.subscription_id,
+                        app.deployment_name,
+                        app.resource_group,
+                        wait=True,
+                    ),
+                )
+            ]
+        )
+        plan.stages = [stage for stage in plan.stages if stage]
+        plans.append(plan)
+
+    return plans
+
+
+def execute_plans(
+    plans: list[TeardownPlan], max_workers: int = 16
+) -> list[BulkResult[TeardownPlan]]:
+    """
+    Executes the teardown plans concurrently. Within a plan, stages run in order and the steps of a stage run
+    in parallel; a failed stage stops the plan so that nothing is deleted out from under a dependent resource.
+    :return: One result per plan
+    """
+
+    def execute_plan(plan: TeardownPlan):
+        if plan.error:
+            raise SweepException(plan.error)
+        for stage in plan.stages:
+            results = run_concurrently(
+                stage,
+                lambda step: step.action(),
+                max_workers=min(len(stage), max_workers),
+                name=f"Teardown of {plan.app.deployment_name}",
+            )
+            failed = [r.item.target for r in results if not r.succeeded]
+            if failed:
+                raise SweepException(
+                    f"Teardown of {plan.app.deployment_name} stopped, failed to delete {failed}"
+                )
+
+    results = run_concurrently(
+        plans, execute_plan, max_workers=max_workers, name="Teardown", adaptive=True
+    )
+    for result in results:
+        logging.info(
+            f"{result.item.app.deployment_name}: {'deleted' if result.succeeded else 'FAILED'} in {result.elapsed_seconds:.0f}s"
+        )
+    return results
+
+
+def _delete_billing_profile(bpm_host: str, profile_id: str):
+    billing_profiles.delete_billing_profile(bpm_host, profile_id)
+    # landing zone creations that failed after allocating their address space leave no landing zone to free it
+    released = ipam.release_owner(profile_id)
+    if released:
+        logging.info(f"Released {released} from billing profile {profile_id}")
+
+
+def _workspace_step(project_name: str, workspace_name: str) -> TeardownStep:
+    return TeardownStep(
+        "workspace",
+        f"{project_name}/{workspace_name}",
+        partial(workspace.delete_workspace, workspace_name, project_name),
+    )
+
+
+def _render_plans(plans: list[TeardownPlan]):
+    rows = [
+        {
+            "MRG": plan.app.deployment_name,
+            "Subscription": plan.app.subscription_id,
+            "Created": plan.app.created_time.isoformat(timespec="seconds"),
+            "Stage": n,
+            "Kind": step.kind,
+            "Target": step.target,
+        }
+        for plan in plans
+        for n, stage in enumerate(plan.stages, start=1)
+        for step in stage
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys"))
+
+
+def _prefix(value: str) -> str:
+    if len(value.strip()) < MIN_PREFIX_LENGTH:
+        raise argparse.ArgumentTypeError(
+            f"Must be at least {MIN_PREFIX_LENGTH} characters, '{value}' found"
+        )
+    return value
+
+
+def _sweep_cmd(args):
+    apps = find_stale_applications(
+        args.subscription_ids, args.prefix, timedelta(hours=args.older_than_hours)
+    )
+    logging.info(f"Found {len(apps)} stale managed apps")
+    if args.shard:
+        apps = shard.select(apps, lambda app: app.deployment_name, args.shard)
+        logging.info(f"Shard {args.shard} owns {len(apps)} of them")
+    if not apps:
+        return
+
+    plans = build_teardown_plans(apps)
+    _render_plans(plans)
+    if args.dry_run:
+        return
+
+    results = execute_plans(plans, args.concurrency)
+    if args.report:
+        shard.write_report(
+            args.report,
+            "sweep",
+            args.shard,
+            shard.bulk_entries(results, lambda plan: plan.app.deployment_name),
+        )
+    failures = len([r for r in results if not r.succeeded])
+    if failures:
+        logging.error(f"{failures} of {len(plans)} teardowns failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-u", "--user_token", required=False)
+    parser.add_argument("-s", "--subscription_ids", nargs="+", required=True)
+    parser.add_argument(
+        "-p",
+        "--prefix",
+        required=True,
+        type=_prefix,
+        help=f"Name prefix of the managed applications to tear down (at least {MIN_PREFIX_LENGTH} characters)",
+    )
+    parser.add_argument(
+        "-o", "--older_than_hours", required=False, default=24, type=float
+    )
+    parser.add_argument("-c", "--concurrency", required=False, default=16, type=int)
+    parser.add_argument("--dry_run", required=False, default=False, action="store_true")
+    cli.setup_parser_shard_args(parser)
+    parser.set_defaults(func=_sweep_cmd)
+
+    cli.setup_parser_terra_env_args(parser)
+    args = cli.parse_args_and_init_config(parser)
+
+    args.func(args)
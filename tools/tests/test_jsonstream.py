@@ -0,0 +1,66 @@
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+from utils import jsonstream
+
+
+class _ChunkedResponse(requests.Response):
+    def __init__(self, body: bytes, chunk_size: int):
+        super().__init__()
+        self.status_code = 200
+        self._chunks = [
+            body[i : i + chunk_size] for i in range(0, len(body), chunk_size)
+        ]
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        return iter(self._chunks)
+
+
+class IterItemsTest(unittest.TestCase):
+    DOCUMENT = {
+        "results": [
+            {"id": 12.75, "name": "ws-é", "tags": [1, -2e3, True, None]},
+            {"id": 1234, "name": "x", "nested": {"ok": False, "n": 0.5}},
+            {"id": 7, "name": "y"},
+        ],
+        "total": 3,
+    }
+
+    def _items(self, body: bytes, chunk_size: int, path: str = "", fields=None):
+        with mock.patch.object(jsonstream, "ijson", None):
+            response = _ChunkedResponse(body, chunk_size)
+            return list(jsonstream.iter_items(response, path, fields))
+
+    def test_one_byte_chunks(self):
+        body = json.dumps(self.DOCUMENT).encode("utf-8")
+        for chunk_size in (1, 2, 3, 7, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    self._items(body, chunk_size, "results"),
+                    self.DOCUMENT["results"],
+                )
+
+    def test_number_split_after_point(self):
+        # chunks "[12." and "75, " and "3]"
+        self.assertEqual(self._items(b"[12.75, 3]", 4), [12.75, 3])
+
+    def test_number_split_between_digits(self):
+        # chunks "[12, 34" and "56]"
+        self.assertEqual(self._items(b"[12, 3456]", 7), [12, 3456])
+
+    def test_fields(self):
+        body = json.dumps(self.DOCUMENT).encode("utf-8")
+        self.assertEqual(
+            self._items(body, 1, "results", ["id", "nested.ok"]),
+            [{"id": 12.75}, {"id": 1234, "nested": {"ok": False}}, {"id": 7}],
+        )
+
+    def test_missing_path(self):
+        self.assertEqual(self._items(b'{"other": [1]}', 1, "results"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,296 @@
+"""
+Helpers for Azure Resource Manager long-running operations and batched status reads.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+import requests
+from azure.core.credentials import AccessToken
+from requests.structures import CaseInsensitiveDict
+
+from utils import auth, bulk, http, poll
+
+ARM_HOST = "https://management.azure.com"
+ARM_BATCH_URL = f"{ARM_HOST}/batch?api-version=2020-06-01"
+ARM_BATCH_MAX_REQUESTS = 500
+
+ARM_ASYNC_OPERATION_HEADER = "Azure-AsyncOperation"
+ARM_LOCATION_HEADER = "Location"
+ARM_RETRY_AFTER_HEADER = "Retry-After"
+
+ARM_OPERATION_IN_PROGRESS_STATES = ["InProgress", "Accepted", "Running", "Creating"]
+ARM_OPERATION_FAILED_STATES = ["Failed", "Canceled"]
+
+
+class ArmOperationException(Exception):
+    pass
+
+
+@dataclass
+class ArmBatchResponse:
+    """
+    One response from an ARM $batch call.
+    """
+
+    url: str
+    status_code: int
+    headers: CaseInsensitiveDict
+    body: Optional[dict]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ArmOperationException(
+                f"{self.status_code} from ARM for {self.url} => {self.body}"
+            )
+
+
+class ArmBatcher:
+    """
+    Coalesces ARM GET requests issued concurrently from many threads into ARM $batch calls. Callers block in
+    `get` while a dispatcher thread collects requests for up to window_seconds (or until a batch is full), sends
+    them as a single batch and fans the individual responses back out to the waiting callers.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 0.5,
+        max_batch_size: int = ARM_BATCH_MAX_REQUESTS,
+    ):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._token: Optional[AccessToken] = None
+
+    def get(self, url: str) -> ArmBatchResponse:
+        """
+        Issues a GET for the given ARM URL (absolute, or relative to the ARM host) as part of the next batch. The
+        response is reported to the adaptive limit of the calling thread's bulk operation, if any, since the batch
+        itself is sent from the dispatcher thread.
+        """
+        start = time.monotonic()
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((url, future))
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+
+        endpoint = bulk.endpoint_key("GET", _relative_url(url))
+        try:
+            response = future.result()
+        except requests.HTTPError as e:
+            if e.response is not None:
+                bulk.observe_current(
+                    time.monotonic() - start,
+                    _is_overloaded(e.response.status_code),
+                    endpoint,
+                )
+            raise
+        bulk.observe_current(
+            time.monotonic() - start, _is_overloaded(response.status_code), endpoint
+        )
+        return response
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    if not self._cond.wait(timeout=60) and not self._pending:
+                        # idle for a while, let the thread exit; get() restarts it on demand
+                        self._dispatcher = None
+                        return
+                    continue
+
+                deadline = time.monotonic() + self.window_seconds
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+
+                batch = self._pending[: self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size :]
+
+            try:
+                responses = self._send_batch([url for url, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (url, future), response in zip(batch, responses):
+                future.set_result(response)
+
+    def _send_batch(self, urls: list[str]) -> list[ArmBatchResponse]:
+        logging.debug(f"Sending ARM batch of {len(urls)} requests")
+        body = {
+            "requests": [
+                {"name": f"{i}", "httpMethod": "GET", "url": _relative_url(url)}
+                for i, url in enumerate(urls)
+            ]
+        }
+        headers = auth.build_auth_headers(self._get_token())
+        result = http.get_session().post(
+            ARM_BATCH_URL, headers=headers, data=json.dumps(body)
+        )
+        result.raise_for_status()
+
+        # large batches may be processed asynchronously, in which case ARM hands back a Location to poll
+        while result.status_code == 202:
+            poll.sleep(parse_retry_after(result.headers) or 1)
+            result = http.get_session().get(
+                result.headers[ARM_LOCATION_HEADER], headers=headers
+            )
+            result.raise_for_status()
+
+        by_name = {r["name"]: r for r in result.json()["responses"]}
+        responses = []
+        for i, url in enumerate(urls):
+            r = by_name[f"{i}"]
+            responses.append(
+                ArmBatchResponse(
+                    url=url,
+                    status_code=r["httpStatusCode"],
+                    headers=CaseInsensitiveDict(r.get("headers") or {}),
+                    body=r.get("content"),
+                )
+            )
+        return responses
+
+    def _get_token(self) -> str:
+        with self._cond:
+            if self._token is None or self._token.expires_on - 300 < time.time():
+                self._token = auth.get_azure_access_token()
+            return self._token.token
+
+
+_shared_batcher: Optional[ArmBatcher] = None
+_shared_batcher_lock = threading.Lock()
+
+
+def get_shared_batcher() -> ArmBatcher:
+    """
+    Returns the process-wide batcher, so that status reads from all concurrent operations share batches.
+    """
+    global _shared_batcher
+    with _shared_batcher_lock:
+        if _shared_batcher is None:
+            _shared_batcher = ArmBatcher()
+        return _shared_batcher
+
+
+def _is_overloaded(status_code: int) -> bool:
+    return status_code == 429 or status_code // 100 == 5
+
+
+def _relative_url(url: str) -> str:
+    return url[len(ARM_HOST) :] if url.startswith(ARM_HOST) else url
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, which ARM may send either as a number of seconds or as an HTTP date.
+    """
+    value = headers.get(ARM_RETRY_AFTER_HEADER)
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+def has_async_operation(response: requests.Response) -> bool:
+    return ARM_ASYNC_OPERATION_HEADER in response.headers or (
+        response.status_code == 202 and ARM_LOCATION_HEADER in response.headers
+    )
+
+
+def wait_for_async_operation(
+    name: str,
+    response: requests.Response,
+    max_wait_time_seconds: int,
+    default_poll_interval_seconds: int = 5,
+    history_key: Optional[str] = None,
+):
+    """
+    Waits for an ARM long-running operation started by the given response to finish. Follows the
+    Azure-AsyncOperation header when present, falling back to the Location header, and honors the Retry-After
+    interval ARM suggests on each response. Status reads go through the shared ARM batcher.
+    :param name: Name of the operation, for logging
+    :param response: Response to the PUT/DELETE/POST that started the operation
+    :param max_wait_time_seconds: How long to wait before giving up
+    :param default_poll_interval_seconds: Interval to use when ARM doesn't suggest one
+    :param history_key: Key to record the operation's duration under, see poll.poll_predicate
+    :return: Final body of the operation status, if any
+    """
+    if ARM_ASYNC_OPERATION_HEADER in response.headers:
+        status_url = response.headers[ARM_ASYNC_OPERATION_HEADER]
+        poll_fn = lambda: _async_operation_poller(name, status_url)
+    elif ARM_LOCATION_HEADER in response.headers:
+        status_url = response.headers[ARM_LOCATION_HEADER]
+        poll_fn = lambda: _location_poller(status_url)
+    else:
+        raise ArmOperationException(
+            f"{name} response has no {ARM_ASYNC_OPERATION_HEADER} or {ARM_LOCATION_HEADER} header to follow"
+        )
+
+    _, result = poll.poll_predicate(
+        name,
+        max_wait_time_seconds,
+        default_poll_interval_seconds,
+        poll_fn,
+        next_interval_fn=lambda r: r["retry_after"],
+        history_key=history_key,
+        initial_wait_seconds=parse_retry_after(response.headers) or 0,
+    )
+    return result["body"]
+
+
+def _async_operation_poller(name: str, status_url: str):
+    status_response = get_shared_batcher().get(status_url)
+    status_response.raise_for_status()
+    body = status_response.body or {}
+    result = {"body": body, "retry_after": parse_retry_after(status_response.headers)}
+
+    status = body.get("status")
+    if status in ARM_OPERATION_IN_PROGRESS_STATES:
+        return False, result
+    elif status in ARM_OPERATION_FAILED_STATES:
+        raise ArmOperationException(f"{name} failed => {body}")
+    elif status == "Succeeded":
+        return True, result
+    else:
+        raise ArmOperationException(f"Unknown ARM operation status => {status}")
+
+
+def _location_poller(status_url: str):
+    status_response = get_shared_batcher().get(status_url)
+    status_response.raise_for_status()
+    result = {
+        "body": status_response.body,
+        "retry_after": parse_retry_after(status_response.headers),
+    }
+    if status_response.status_code == 202:
+        return False, result
+
+    logging.debug(f"Location poll complete with {status_response.status_code}")
+    return True, result
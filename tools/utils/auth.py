@@ -1,4 +1,10 @@
+import calendar
+import json
 import logging
+import os
+import threading
+import time
+from typing import Optional
 
 from azure.core.credentials import AccessToken, TokenCredential
 from azure.identity import DefaultAzureCredential
@@ -6,6 +12,8 @@ from azure.identity import DefaultAzureCredential
 import google.auth
 from google.auth.transport.requests import Request
 
+from utils import http, profiling, tokencache
+
 logger = logging.getLogger("azure")
 
 # Set the desired logging level
@@ -13,31 +21,145 @@ logger.setLevel(logging.WARN)
 
 USER_TOKEN = None
 
+# when set, tokens are shared with other processes through the on-disk token cache
+TOKEN_CACHE = False
+
+GCP_SCOPES = [
+    "openid",
+    "email",
+    "profile",
+    "https://www.googleapis.com/auth/cloud-platform",
+]
+
+REPLAY_TOKEN = "replay-token"
+
+# the ADC token is reused until it is about to expire rather than refreshed on every call (i.e. every poll)
+_gcp_token: Optional[tuple[str, int]] = None
+_gcp_token_lock = threading.Lock()
+
+# lifetime assumed for credentials that don't report their expiry
+GCP_TOKEN_FALLBACK_LIFETIME = 600 + tokencache.EXPIRY_MARGIN_SECONDS
+
+
+class _ReplayCredential:
+    """
+    Stands in for the azure credential when replaying recorded HTTP sessions, so no login is needed.
+    """
+
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken(REPLAY_TOKEN, int(time.time()) + 3600)
+
+
+class _CachingCredential:
+    """
+    Wraps a credential so that its tokens are shared through the on-disk token cache. The azure identity is
+    taken from the environment variables DefaultAzureCredential reads, falling back to the account and tenant of
+    the local `az login`.
+    """
+
+    def __init__(self, credential: TokenCredential):
+        self._credential = credential
+        self._identity = "azure:{}:{}:{}".format(
+            os.environ.get("AZURE_TENANT_ID", ""),
+            os.environ.get("AZURE_CLIENT_ID", ""),
+            os.environ.get("AZURE_USERNAME", "")
+            or ("" if os.environ.get("AZURE_CLIENT_ID") else _azure_cli_account()),
+        )
+
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        def refresh() -> tuple[str, int]:
+            access_token = self._credential.get_token(*scopes, **kwargs)
+            return access_token.token, access_token.expires_on
+
+        token, expires_on = tokencache.get_or_refresh(
+            tokencache.cache_key(self._identity, scopes), refresh
+        )
+        return AccessToken(token, expires_on)
+
+
+def _azure_cli_account() -> str:
+    """
+    The user and tenant of the default subscription of the Azure CLI login, which is the one AzureCliCredential
+    uses.
+    """
+    config_dir = os.environ.get("AZURE_CONFIG_DIR", os.path.expanduser("~/.azure"))
+    try:
+        with open(
+            os.path.join(config_dir, "azureProfile.json"),
+            mode="r",
+            encoding="utf-8-sig",
+        ) as f:
+            subscriptions = json.load(f).get("subscriptions", [])
+    except (OSError, ValueError):
+        return "default"
+    for subscription in subscriptions:
+        if subscription.get("isDefault"):
+            return "{}@{}".format(
+                subscription.get("user", {}).get("name", ""),
+                subscription.get("tenantId", ""),
+            )
+    return "default"
+
 
 def get_azure_access_token() -> AccessToken:
-    token_credential = DefaultAzureCredential()
-    return token_credential.get_token("https://management.core.windows.net/.default")
+    token_credential = get_azure_credential()
+    with profiling.phase("auth", "azure access token"):
+        return token_credential.get_token(
+            "https://management.core.windows.net/.default"
+        )
 
 
 def get_azure_credential() -> TokenCredential:
+    if http.is_replaying():
+        return _ReplayCredential()
+    if TOKEN_CACHE:
+        return _CachingCredential(DefaultAzureCredential())
     return DefaultAzureCredential()
 
 
 def get_gcp_token():
+    if http.is_replaying():
+        return REPLAY_TOKEN
+
     if USER_TOKEN:
         logger.info("Returning provided user token instead of using ADC credentials...")
         return USER_TOKEN
 
-    DEFAULT_SCOPES = [
-        "openid",
-        "email",
-        "profile",
-        "https://www.googleapis.com/auth/cloud-platform",
-    ]
-    credentials, project_id = google.auth.default(scopes=DEFAULT_SCOPES)
-    credentials.refresh(Request())
-    token = credentials.token
-    return token
+    global _gcp_token
+    with _gcp_token_lock:
+        if (
+            _gcp_token is None
+            or _gcp_token[1] - tokencache.EXPIRY_MARGIN_SECONDS <= time.time()
+        ):
+            with profiling.phase("auth", "gcp access token"):
+                _gcp_token = _refresh_gcp_token()
+        return _gcp_token[0]
+
+
+def _refresh_gcp_token() -> tuple[str, int]:
+    credentials, project_id = google.auth.default(scopes=GCP_SCOPES)
+
+    def refresh() -> tuple[str, int]:
+        credentials.refresh(Request())
+        if credentials.expiry is None:
+            return credentials.token, int(time.time()) + GCP_TOKEN_FALLBACK_LIFETIME
+        return credentials.token, calendar.timegm(credentials.expiry.timetuple())
+
+    if not TOKEN_CACHE:
+        return refresh()
+
+    # user credentials share gcloud's client_id, so tell users apart by their account, or failing that their
+    # refresh token (only its hash ends up in the cache)
+    identity = "gcp:{}:{}".format(
+        os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", ""),
+        getattr(credentials, "service_account_email", None)
+        or getattr(credentials, "account", None)
+        or getattr(credentials, "refresh_token", None)
+        or getattr(credentials, "audience", None),
+    )
+    return tokencache.get_or_refresh(
+        tokencache.cache_key(identity, GCP_SCOPES), refresh
+    )
 
 
 def build_auth_headers(token: str):
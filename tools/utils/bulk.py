@@ -0,0 +1,208 @@
+"""
+Helpers for running many independent operations concurrently.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+
+from utils import http
+
+T = TypeVar("T")
+
+# AIMD tuning: the limit grows by about one per limit's worth of healthy responses (one per round trip), and is cut
+# by this factor on overload, at most once per typical response time (and MIN_DECREASE_INTERVAL_SECONDS) so that
+# the responses already in flight when the service pushed back don't each cut it again
+DECREASE_FACTOR = 0.5
+MIN_DECREASE_INTERVAL_SECONDS = 0.05
+# latency counts as spiking when its moving average exceeds the healthy baseline by this factor
+LATENCY_SPIKE_FACTOR = 2.5
+LATENCY_SMOOTHING = 0.2
+BASELINE_DRIFT = 0.01
+
+
+@dataclass
+class BulkResult(Generic[T]):
+    item: T
+    result: Any = None
+    error: Optional[Exception] = None
+    elapsed_seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+class AdaptiveLimit:
+    """
+    Additive-increase/multiplicative-decrease concurrency limit. Healthy responses slowly raise the number of
+    operations allowed in flight, up to max_limit; 5xx responses, 429s, exhausted retries and latency rising well
+    above its healthy baseline halve it, down to min_limit. Latency is tracked per endpoint, so a run mixing slow
+    calls (deletes, creates) with fast ones (status polls) only reacts when an endpoint slows down relative to itself.
+    """
+
+    def __init__(
+        self, max_limit: int, min_limit: int = 1, initial: Optional[int] = None
+    ):
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.limit = float(initial or max(min_limit, self.max_limit // 2))
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        # endpoint -> [smoothed latency, healthy baseline]
+        self._latencies: dict[str, list[float]] = {}
+        self._last_decrease = 0.0
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def on_response(self, response: requests.Response):
+        self.observe(
+            response.elapsed.total_seconds(),
+            http.is_response_5xx(response) or response.status_code == 429,
+            _endpoint(response),
+        )
+
+    def observe(
+        self, latency_seconds: float, overloaded: bool = False, endpoint: str = ""
+    ):
+        with self._condition:
+            latency = self._latencies.get(endpoint)
+            if not overloaded:
+                latency = self._update_latency(endpoint, latency_seconds)
+            spiking = (
+                latency is not None and latency[0] > LATENCY_SPIKE_FACTOR * latency[1]
+            )
+            if overloaded or spiking:
+                self._decrease(
+                    "overload" if overloaded else f"latency spike on {endpoint}",
+                    latency[0] if latency else 0,
+                )
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def _update_latency(self, endpoint: str, latency_seconds: float) -> list[float]:
+        latency = self._latencies.get(endpoint)
+        if latency is None:
+            latency = self._latencies[endpoint] = [latency_seconds, latency_seconds]
+            return latency
+        latency[0] += LATENCY_SMOOTHING * (latency_seconds - latency[0])
+        # the baseline tracks the lowest smoothed latency, drifting up slowly so it can follow a lasting change
+        latency[1] = min(
+            latency[0], latency[1] + BASELINE_DRIFT * (latency[0] - latency[1])
+        )
+        return latency
+
+    def _decrease(self, reason: str, latency_seconds: float):
+        now = time.monotonic()
+        if now - self._last_decrease < max(
+            MIN_DECREASE_INTERVAL_SECONDS, latency_seconds
+        ):
+            return
+        self._last_decrease = now
+        limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+        if int(limit) < int(self.limit):
+            logging.info(
+                f"Concurrency reduced from {int(self.limit)} to {int(limit)} ({reason})"
+            )
+        self.limit = limit
+
+
+def _endpoint(response: requests.Response) -> str:
+    return endpoint_key(response.request.method or "", response.request.url or "")
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """
+    Groups requests by method, host, API prefix and path depth, e.g. "DELETE rawls.../api/workspaces/*/*/*", so
+    that calls on different resources of the same kind share latency statistics.
+    """
+    parts = urlsplit(url)
+    segments = parts.path.strip("/").split("/")
+    path = "/".join(segments[:2] + ["*"] * (len(segments) - 2))
+    return f"{method} {parts.netloc}/{path}"
+
+
+# the adaptive limit of the run_concurrently operation executing on the current thread, if any
+_current = threading.local()
+
+
+def _observe_response(response: requests.Response):
+    limit = getattr(_current, "limit", None)
+    if limit is not None:
+        limit.on_response(response)
+
+
+http.add_response_observer(_observe_response)
+
+
+def observe_current(
+    latency_seconds: float, overloaded: bool = False, endpoint: str = ""
+):
+    """
+    Reports the outcome of a call made for the run_concurrently operation executing on the current thread whose
+    HTTP response arrived on another thread (e.g. a request sent by the ARM batcher), so that it counts towards
+    the operation's adaptive limit. Does nothing outside adaptive runs.
+    """
+    limit = getattr(_current, "limit", None)
+    if limit is not None:
+        limit.observe(latency_seconds, overloaded, endpoint)
+
+
+def run_concurrently(
+    items: Iterable[T],
+    fn: Callable[[T], Any],
+    max_workers: int = 8,
+    name: str = "operation",
+    adaptive: bool = False,
+) -> list[BulkResult[T]]:
+    """
+    Runs fn over every item with at most max_workers in flight. Errors are captured per item rather than
+    aborting the whole run.
+    :param adaptive: Adjust the number in flight, up to max_workers, to what the services keep up with (see
+    AdaptiveLimit), judged from the HTTP responses the operations receive, including those delivered through the
+    ARM batcher (see observe_current). Responses received by nested non-adaptive runs count towards the
+    enclosing adaptive run; other runs' responses are not seen.
+    :return: One result per item, in the order the items were supplied
+    """
+    limit = AdaptiveLimit(max_workers) if adaptive else None
+    scope = limit or getattr(_current, "limit", None)
+
+    def run_one(item: T) -> BulkResult[T]:
+        if limit:
+            limit.acquire()
+        enclosing = getattr(_current, "limit", None)
+        _current.limit = scope
+        start = time.monotonic()
+        try:
+            result = fn(item)
+        except Exception as e:
+            logging.error(f"{name} failed for {item} => {e}")
+            if limit and isinstance(
+                e, (requests.exceptions.RetryError, requests.ConnectionError)
+            ):
+                limit.observe(time.monotonic() - start, overloaded=True)
+            return BulkResult(item, error=e, elapsed_seconds=time.monotonic() - start)
+        finally:
+            _current.limit = enclosing
+            if limit:
+                limit.release()
+        return BulkResult(item, result=result, elapsed_seconds=time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_one, items))
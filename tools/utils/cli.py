@@ -1,8 +1,12 @@
 import argparse
+import logging
+import os
+import sys
+import time
 from argparse import Namespace
 from typing import Tuple
 
-from utils import auth
+from utils import auth, http, profiling, progress, shard
 from utils.conf import TerraEnvs, Configuration
 
 
@@ -19,6 +23,76 @@ def setup_parser_terra_env_args(parser: argparse.ArgumentParser):
         type=str.lower,
     )
     parser.add_argument("-b", "--bee", required=False)
+    parser.add_argument(
+        "--record",
+        required=False,
+        help="Record all HTTP interactions to this cassette file",
+    )
+    parser.add_argument(
+        "--replay",
+        required=False,
+        help="Serve all HTTP interactions from this cassette file instead of the network",
+    )
+    parser.add_argument(
+        "--replay_speed",
+        required=False,
+        default=1.0,
+        type=float,
+        help="Playback speed for --replay relative to the recording; 0 replays without delays",
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        nargs="?",
+        const="",
+        help="Profile the run (CPU time of all threads, merged) and write <PROFILE>.pstats and a <PROFILE>.txt "
+        "summary; defaults to profile-<script>-<timestamp>",
+    )
+    parser.add_argument(
+        "--token_cache",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Share access tokens with other concurrent invocations through an on-disk cache",
+    )
+    parser.add_argument(
+        "--events",
+        required=False,
+        help="Append a JSONL stream of progress events for long-running waits to this file",
+    )
+    parser.add_argument(
+        "--progress_interval",
+        required=False,
+        default=progress.SUMMARY_INTERVAL_SECONDS,
+        type=float,
+        help="Seconds between progress summaries of long-running waits",
+    )
+
+
+def setup_parser_shard_args(parser: argparse.ArgumentParser):
+    """
+    Add args for splitting a bulk command across machines and reporting each machine's results
+    """
+    parser.add_argument(
+        "--shard",
+        required=False,
+        type=shard.parse_shard,
+        help="Only handle the resources that hash to shard i of N (i/N, 0-based)",
+    )
+    parser.add_argument(
+        "--report",
+        required=False,
+        help="Write a JSON report of per-resource results, for merging with `shards.py merge`",
+    )
+
+
+def log_to_stderr():
+    """
+    Moves log output from stdout to stderr, for commands that write machine-readable output to stdout
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
 
 
 def parse_args_and_init_config(
@@ -35,6 +109,23 @@ def parse_args_and_init_config(
 
     args = parser.parse_args()
 
+    if args.profile is not None:
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        profiling.enable(
+            args.profile or f"profile-{script}-{time.strftime('%Y%m%d-%H%M%S')}"
+        )
+
+    if args.record and args.replay:
+        parser.error("Only one of --record and --replay may be given")
+    elif args.record:
+        http.enable_recording(args.record)
+    elif args.replay:
+        http.enable_replay(args.replay, args.replay_speed)
+
+    progress.configure(args.progress_interval, args.events)
+
+    auth.TOKEN_CACHE = args.token_cache
+
     if "user_token" in args and args.user_token is not None:
         auth.USER_TOKEN = args.user_token
 
@@ -79,6 +79,7 @@ class Configuration:
     """
 
     __config = None
+    __env = None
 
     @staticmethod
     def initialize(env: TerraEnvs, overrides=None):
@@ -86,11 +87,19 @@ class Configuration:
             overrides = {}
 
         Configuration.__config = Configuration._render_conf(env, overrides)
+        Configuration.__env = env
 
     @staticmethod
     def get_environments():
         return [env.value for env in TerraEnvs]
 
+    @staticmethod
+    def get_env():
+        if not Configuration.__env:
+            raise Exception("Configuration not initialized")
+
+        return Configuration.__env
+
     @staticmethod
     def get_config():
         if not Configuration.__config:
@@ -98,9 +107,16 @@ class Configuration:
 
         return Configuration.__config
 
+    @staticmethod
+    def get_config_for_env(env: TerraEnvs, overrides=None):
+        """
+        Renders the configuration of any environment, without changing the one the process was initialized with.
+        """
+        return Configuration._render_conf(env, overrides or {})
+
     @staticmethod
     def _render_conf(env: TerraEnvs, overrides):
-        c = _environments[env]
+        c = dict(_environments[env])
         for k, v in c.items():
             if isinstance(v, str):
                 c[k] = v.format(**overrides)
@@ -0,0 +1,118 @@
+"""
+Local history of how long long-running operations take, per operation type and Terra environment.
+
+Completed waits are recorded to a SQLite database; the recorded distribution is used to schedule polls (sparse
+while the operation is unlikely to be done, dense around its usual finishing time) and to estimate time remaining.
+"""
+
+import logging
+import os
+import sqlite3
+import statistics
+import time
+from contextlib import closing
+from typing import Optional
+
+from utils.conf import Configuration
+
+HISTORY_PATH = os.path.expanduser("~/.terra-tools/history.db")
+
+# how many of the most recent durations to base the schedule on, and how many are needed before trusting them
+HISTORY_WINDOW = 50
+MIN_HISTORY = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    operation TEXT NOT NULL,
+    env TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS durations_idx ON durations (operation, env, finished_at);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    conn = sqlite3.connect(HISTORY_PATH, timeout=30, isolation_level=None)
+    try:
+        conn.executescript(_SCHEMA)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def _current_env() -> str:
+    try:
+        return f"{Configuration.get_env()}"
+    except Exception:
+        return "unknown"
+
+
+def record_duration(operation: str, seconds: float):
+    """
+    Records how long an operation took in the current environment. Failures to write the history are logged and
+    otherwise ignored; the history is an optimization, not a requirement.
+    """
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT INTO durations (operation, env, seconds, finished_at) VALUES (?, ?, ?, ?)",
+                (operation, _current_env(), seconds, time.time()),
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Unable to record duration of {operation} => {e}")
+
+
+def get_durations(operation: str) -> list[float]:
+    """
+    Returns the most recent recorded durations of the operation in the current environment.
+    """
+    try:
+        with closing(_connect()) as conn:
+            rows = conn.execute(
+                "SELECT seconds FROM durations WHERE operation = ? AND env = ? ORDER BY finished_at DESC LIMIT ?",
+                (operation, _current_env(), HISTORY_WINDOW),
+            ).fetchall()
+    except sqlite3.Error as e:
+        logging.warning(f"Unable to read duration history of {operation} => {e}")
+        return []
+    return [row[0] for row in rows]
+
+
+class PollSchedule:
+    """
+    Poll intervals derived from the duration history of an operation. Before the fastest usual finish (the 10th
+    percentile) polls are spread out, halving the remaining distance each time; between the 10th and 90th
+    percentiles they run at the base interval; past the 90th percentile the operation is running long and polls
+    back off to twice the base interval. Without enough history every poll uses the base interval.
+    """
+
+    def __init__(self, durations: list[float], base_interval_seconds: float):
+        self.base_interval_seconds = base_interval_seconds
+        self.expected_seconds: Optional[float] = None
+        if len(durations) >= MIN_HISTORY:
+            deciles = statistics.quantiles(durations, n=10)
+            self.early_seconds = deciles[0]
+            self.late_seconds = deciles[-1]
+            self.expected_seconds = statistics.median(durations)
+
+    def next_interval(self, elapsed_seconds: float) -> float:
+        if self.expected_seconds is None:
+            return self.base_interval_seconds
+        if elapsed_seconds < self.early_seconds:
+            return max(
+                self.base_interval_seconds, (self.early_seconds - elapsed_seconds) / 2
+            )
+        if elapsed_seconds <= self.late_seconds:
+            return self.base_interval_seconds
+        return self.base_interval_seconds * 2
+
+    def eta_seconds(self, elapsed_seconds: float) -> Optional[float]:
+        """
+        Estimated time remaining, based on the median duration, or None without enough history.
+        """
+        if self.expected_seconds is None:
+            return None
+        return max(self.expected_seconds - elapsed_seconds, 0)
@@ -1,17 +1,248 @@
+import base64
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Optional
+
 import requests
-from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from urllib3 import Retry
 
+from utils import profiling
+
+# Record/replay of HTTP sessions. When a cassette is active, every session handed out by this module either
+# records its traffic to the cassette file or serves responses from it instead of the network.
+_cassette: Optional["Cassette"] = None
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+# callbacks that see every response received through a session handed out by this module
+_response_observers: tuple[Callable[[requests.Response], None], ...] = ()
+_response_observers_lock = threading.Lock()
+
+# ids the tools generate client-side (job control ids etc.) differ between recording and replay
+_UUID_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE
+)
+
 
 def basic_http_retry() -> Retry:
     return Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
 
 
-def get_session_with_retry() -> requests.Session:
+def get_session_with_retry(pool_size: int = 10, retry: bool = True) -> requests.Session:
+    """
+    Returns a session that retries transient failures. pool_size bounds the number of connections kept open
+    per host, so it should be at least the number of threads sharing the session.
+    :param retry: Whether to retry; measurements of the services turn it off to see every failure
+    """
+    max_retries = basic_http_retry() if retry else Retry(total=0, raise_on_status=False)
     session = requests.Session()
-    session.mount("https://", HTTPAdapter(max_retries=basic_http_retry()))
+    if _cassette is not None and _cassette.replaying:
+        adapter: BaseAdapter = ReplayAdapter(_cassette)
+    elif _cassette is not None:
+        adapter = RecordingAdapter(
+            _cassette,
+            max_retries=max_retries,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+    else:
+        adapter = HTTPAdapter(
+            max_retries=max_retries,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_notify_response_observers)
+    if profiling.is_enabled():
+        session.hooks["response"].append(profiling.record_http)
     return session
 
 
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide session, so that all API calls share pooled connections (and the active cassette).
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = get_session_with_retry(pool_size=32)
+        return _shared_session
+
+
+def azure_transport() -> RequestsTransport:
+    """
+    Transport for azure SDK clients that sends their requests through the shared session.
+    """
+    return RequestsTransport(session=get_session(), session_owner=False)
+
+
 def is_response_5xx(response: requests.Response) -> bool:
-    return response.status_code / 100 == 5
+    return response.status_code // 100 == 5
+
+
+def add_response_observer(observer: Callable[[requests.Response], None]):
+    """
+    Registers a callback to be given every response received through this module's sessions, on the thread
+    that made the request. Responses retried by the adapter are only seen once retries are done.
+    """
+    global _response_observers
+    with _response_observers_lock:
+        _response_observers = _response_observers + (observer,)
+
+
+def remove_response_observer(observer: Callable[[requests.Response], None]):
+    global _response_observers
+    with _response_observers_lock:
+        _response_observers = tuple(o for o in _response_observers if o != observer)
+
+
+def _notify_response_observers(response: requests.Response, *args, **kwargs):
+    for observer in _response_observers:
+        observer(response)
+
+
+class Cassette:
+    """
+    A JSONL file of recorded HTTP interactions. Each line holds the request method and URL, the response status,
+    headers and body, how long the response took and when, relative to the start of the recording, it arrived.
+    Request headers are never recorded, so tokens don't end up in cassettes.
+
+    The first line holds the seed the random module was given while recording; replay reseeds with it so that
+    generated names (e.g. e2e deployment names) come out the same. UUIDs in URLs are ignored when matching.
+    """
+
+    def __init__(self, path: str, replaying: bool, speed: float = 1.0):
+        self.path = path
+        self.replaying = replaying
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._interactions: dict[tuple[str, str], deque] = defaultdict(deque)
+
+        if replaying:
+            with open(path, mode="r") as f:
+                self.seed = json.loads(f.readline())["seed"]
+                for line in f:
+                    interaction = json.loads(line)
+                    key = _interaction_key(interaction["method"], interaction["url"])
+                    self._interactions[key].append(interaction)
+        else:
+            self.seed = random.randrange(2**32)
+            with open(path, mode="w") as f:
+                f.write(json.dumps({"seed": self.seed}) + "\n")
+        random.seed(self.seed)
+
+    def record(
+        self,
+        request: requests.PreparedRequest,
+        response: requests.Response,
+        elapsed: float,
+    ):
+        interaction = {
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "content": base64.b64encode(response.content).decode("ascii"),
+            "elapsed": elapsed,
+            "offset": time.monotonic() - self._start,
+        }
+        with self._lock:
+            with open(self.path, mode="a") as f:
+                f.write(json.dumps(interaction) + "\n")
+
+    def next_interaction(self, request: requests.PreparedRequest) -> dict:
+        """
+        Returns the next recorded interaction for the request's method and URL. Interactions for the same URL
+        are replayed in the order they were recorded, so polling sequences play back as they happened.
+        """
+        key = _interaction_key(request.method or "GET", request.url or "")
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise requests.ConnectionError(
+                    f"No recorded interaction left for {key[0]} {key[1]} in {self.path}"
+                )
+            # keep the last response around so that extra polls at the end of a sequence still get an answer
+            return interactions.popleft() if len(interactions) > 1 else interactions[0]
+
+
+def _interaction_key(method: str, url: str) -> tuple[str, str]:
+    return method, _UUID_PATTERN.sub("{uuid}", url)
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, *args, **kwargs):
+        start = time.monotonic()
+        response = super().send(request, *args, **kwargs)
+        # reading the body here keeps it available to the caller, streamed or not
+        response.content
+        self.cassette.record(request, response, time.monotonic() - start)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, *args, **kwargs):
+        interaction = self.cassette.next_interaction(request)
+        if self.cassette.speed > 0:
+            time.sleep(interaction["elapsed"] / self.cassette.speed)
+
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response._content = base64.b64decode(interaction["content"])
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def close(self):
+        pass
+
+
+def enable_recording(path: str):
+    global _cassette, _shared_session
+    _cassette = Cassette(path, replaying=False)
+    _shared_session = None
+    logging.info(f"Recording HTTP interactions to {path}")
+
+
+def enable_replay(path: str, speed: float = 1.0):
+    """
+    Serves all HTTP traffic from a recorded cassette.
+    :param path: Cassette file to replay
+    :param speed: Playback speed relative to the recording; 0 replays without any delay
+    """
+    global _cassette, _shared_session
+    _cassette = Cassette(path, replaying=True, speed=speed)
+    _shared_session = None
+    logging.info(f"Replaying HTTP interactions from {path} at speed {speed}")
+
+
+def is_replaying() -> bool:
+    return _cassette is not None and _cassette.replaying
+
+
+def replay_speed() -> float:
+    return _cassette.speed if _cassette is not None and _cassette.replaying else 1.0
@@ -0,0 +1,193 @@
+"""
+Allocation of non-overlapping landing zone address spaces.
+
+Landing zone VNets are carved out of a supernet. Allocations are recorded in a local SQLite database and made inside
+an immediate transaction, so concurrent landing zone creations, in this or other processes, never receive overlapping
+blocks, even when allocating from different (overlapping) supernets. Each allocation is owned by a key (the billing profile the landing zone is deployed into); allocating again
+for the same owner returns the same block, so interrupted creations resume with the address space they started with.
+"""
+
+import ipaddress
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional
+
+DEFAULT_DB_PATH = os.path.expanduser("~/.terra-tools/ipam.db")
+DEFAULT_SUPERNET = "10.0.0.0/8"
+
+# the LZ definitions expect a VNet with /22 subnets for these, in this order
+LANDING_ZONE_VNET_PREFIX = 18
+LANDING_ZONE_SUBNET_PREFIX = 22
+LANDING_ZONE_SUBNETS = [
+    "AKS_SUBNET",
+    "BATCH_SUBNET",
+    "POSTGRESQL_SUBNET",
+    "COMPUTE_SUBNET",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS allocations (
+    supernet TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    cidr TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (supernet, owner)
+);
+CREATE INDEX IF NOT EXISTS allocations_start_idx ON allocations (supernet, start);
+"""
+
+
+class AddressSpaceExhausted(Exception):
+    pass
+
+
+class AddressAllocator:
+    """
+    Hands out aligned, non-overlapping blocks of a supernet. Allocations are kept as half-open integer intervals
+    ordered by start address; a new block goes into the first aligned gap, free of allocations from any supernet,
+    that fits it.
+    """
+
+    def __init__(self, supernet: str = DEFAULT_SUPERNET, path: str = DEFAULT_DB_PATH):
+        self.supernet = ipaddress.IPv4Network(supernet)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return _connect(self.path)
+
+    def allocate(
+        self, owner: str, prefix_length: int = LANDING_ZONE_VNET_PREFIX
+    ) -> ipaddress.IPv4Network:
+        """
+        Returns the block owned by owner, allocating a free one of the given prefix length if it has none.
+        """
+        if prefix_length < self.supernet.prefixlen:
+            raise ValueError(f"A /{prefix_length} does not fit in {self.supernet}")
+        size = 2 ** (32 - prefix_length)
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT cidr FROM allocations WHERE supernet = ? AND owner = ?",
+                (str(self.supernet), owner),
+            ).fetchone()
+            if existing:
+                conn.execute("COMMIT")
+                return ipaddress.IPv4Network(existing[0])
+
+            # allocations from other supernets count too, in case the supernets overlap
+            lower = int(self.supernet.network_address)
+            upper = int(self.supernet.broadcast_address) + 1
+            intervals = conn.execute(
+                "SELECT start, end FROM allocations WHERE start < ? AND end > ? ORDER BY start",
+                (upper, lower),
+            ).fetchall()
+            start = _first_fit(intervals, lower, upper, size)
+            if start is None:
+                raise AddressSpaceExhausted(
+                    f"No free /{prefix_length} left in {self.supernet}"
+                )
+
+            block = ipaddress.IPv4Network((start, prefix_length))
+            conn.execute(
+                "INSERT INTO allocations (supernet, start, end, cidr, owner, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(self.supernet),
+                    start,
+                    start + size,
+                    str(block),
+                    owner,
+                    time.time(),
+                ),
+            )
+            conn.execute("COMMIT")
+            return block
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def release(self, owner: str) -> Optional[str]:
+        """
+        Frees the block owned by owner.
+        :return: The freed block, or None if owner had none
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT cidr FROM allocations WHERE supernet = ? AND owner = ?",
+                (str(self.supernet), owner),
+            ).fetchone()
+            conn.execute(
+                "DELETE FROM allocations WHERE supernet = ? AND owner = ?",
+                (str(self.supernet), owner),
+            )
+        return row[0] if row else None
+
+    def list(self) -> list[tuple[str, str]]:
+        """
+        :return: (cidr, owner) of every allocation in the supernet, in address order
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT cidr, owner FROM allocations WHERE supernet = ? ORDER BY start",
+                (str(self.supernet),),
+            ).fetchall()
+
+
+def release_owner(owner: str, path: str = DEFAULT_DB_PATH) -> list[str]:
+    """
+    Frees the blocks owned by owner in every supernet, for teardowns that don't know which supernet the landing
+    zone was allocated from.
+    :return: The freed blocks
+    """
+    if not os.path.exists(path):
+        return []
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT cidr FROM allocations WHERE owner = ?", (owner,)
+        ).fetchall()
+        conn.execute("DELETE FROM allocations WHERE owner = ?", (owner,))
+    return [row[0] for row in rows]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(path, timeout=30, isolation_level=None)
+
+
+def _first_fit(
+    intervals: list[tuple[int, int]], lower: int, upper: int, size: int
+) -> Optional[int]:
+    """
+    Finds the lowest start, aligned to size, of a free [start, start + size) within [lower, upper).
+    :param intervals: Allocated half-open intervals, ordered by start; they may overlap each other
+    """
+    candidate = _align_up(lower, size)
+    for start, end in intervals:
+        if candidate + size <= start:
+            break
+        candidate = max(candidate, _align_up(end, size))
+    return candidate if candidate + size <= upper else None
+
+
+def _align_up(address: int, size: int) -> int:
+    return (address + size - 1) // size * size
+
+
+def landing_zone_network_parameters(vnet: ipaddress.IPv4Network) -> list[dict]:
+    """
+    The landing zone parameters placing the VNet and its subnets in the given block.
+    """
+    subnets = vnet.subnets(new_prefix=LANDING_ZONE_SUBNET_PREFIX)
+    return [{"key": "VNET_ADDRESS_SPACE", "value": str(vnet)}] + [
+        {"key": key, "value": str(next(subnets))} for key in LANDING_ZONE_SUBNETS
+    ]
@@ -0,0 +1,382 @@
+"""
+Durable, SQLite-backed job queue for long-running provisioning operations.
+
+Jobs are enqueued with a kind and a JSON-serializable set of parameters, claimed by a pool of worker threads and
+checkpointed after every completed stage. A worker keeps a lease on each job it runs by heartbeating; if the
+process dies, the lease expires and the job is reclaimed by the next worker, which resumes from the last
+checkpoint rather than starting over.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Any, Callable, Optional
+
+DEFAULT_DB_PATH = os.path.expanduser("~/.terra-tools/jobs.db")
+DEFAULT_LEASE_SECONDS = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    env TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    state TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (env, status, created);
+"""
+
+
+class LeaseLostException(Exception):
+    """
+    Raised when a worker updates a job it no longer holds, because its lease expired and the job was reclaimed.
+    """
+
+
+class JobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    env: str
+    params: dict
+    status: str
+    stage: Optional[str]
+    state: dict
+    result: Any
+    error: Optional[str]
+    attempts: int
+    worker: Optional[str]
+    created: float
+    updated: float
+
+
+def queue_env(env: str, bee: Optional[str] = None) -> str:
+    """
+    Jobs are scoped to the environment they were enqueued for; BEEs are further scoped by name.
+    """
+    return f"{env}:{bee}" if bee else env
+
+
+class Checkpoint:
+    """
+    Records the stages an operation has completed, along with any values needed to resume it (generated names,
+    ids returned by the APIs, etc.). Operations that accept a checkpoint skip stages that are already done.
+    A checkpoint without a save callback is purely in-memory, which is what the one-shot CLI commands use.
+    """
+
+    def __init__(
+        self,
+        state: Optional[dict] = None,
+        on_save: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.state = dict(state or {})
+        self.state.setdefault("stages", [])
+        self._on_save = on_save
+
+    def done(self, stage: str) -> bool:
+        return stage in self.state["stages"]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(key, default)
+
+    def save(self, stage: str, **values):
+        self.state.update(values)
+        if stage not in self.state["stages"]:
+            self.state["stages"].append(stage)
+        if self._on_save:
+            self._on_save(stage, self.state)
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue. Each thread gets its own connection; claims are made inside an immediate
+    transaction so that concurrent workers, in this or other processes, never pick up the same job.
+    """
+
+    def __init__(
+        self, path: str = DEFAULT_DB_PATH, lease_seconds: int = DEFAULT_LEASE_SECONDS
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, params: dict, env: str) -> str:
+        job_id = f"{uuid.uuid4()}"
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, env, params, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, env, json.dumps(params), JobStatus.PENDING, now, now),
+        )
+        return job_id
+
+    def claim(self, env: str, worker_id: str) -> Optional[Job]:
+        """
+        Claims the oldest pending job for the given environment, or a running job whose lease has expired
+        because the worker that held it went away.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE env = ? AND (status = ? OR (status = ? AND heartbeat < ?)) "
+                "ORDER BY created LIMIT 1",
+                (
+                    env,
+                    JobStatus.PENDING,
+                    JobStatus.RUNNING,
+                    now - self.lease_seconds,
+                ),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                (JobStatus.RUNNING, worker_id, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = self.get(row["id"])
+        assert job is not None
+        return job
+
+    def heartbeat(self, leases: list[tuple[str, str]]):
+        """
+        :param leases: (job id, worker id) of each running job to extend the lease of
+        """
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+            [(now, job_id, worker, JobStatus.RUNNING) for job_id, worker in leases],
+        )
+
+    # The updates below only apply while the worker still holds the job's lease; once the job has been
+    # reclaimed by another worker they raise LeaseLostException rather than overwrite that worker's progress.
+
+    def save_checkpoint(self, job_id: str, worker: str, stage: str, state: dict):
+        self._update_leased(
+            job_id,
+            worker,
+            "stage = ?, state = ?",
+            (stage, json.dumps(state)),
+        )
+
+    def complete(self, job_id: str, worker: str, result: Any = None):
+        self._update_leased(
+            job_id,
+            worker,
+            "status = ?, result = ?, error = NULL",
+            (JobStatus.SUCCEEDED, json.dumps(result)),
+        )
+
+    def fail(self, job_id: str, worker: str, error: str):
+        self._update_leased(
+            job_id, worker, "status = ?, error = ?", (JobStatus.FAILED, error)
+        )
+
+    def _update_leased(self, job_id: str, worker: str, assignments: str, values: tuple):
+        cursor = self._conn().execute(
+            f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ? AND worker = ? AND status = ?",
+            (*values, time.time(), job_id, worker, JobStatus.RUNNING),
+        )
+        if cursor.rowcount != 1:
+            raise LeaseLostException(
+                f"Job {job_id} is no longer held by worker {worker}"
+            )
+
+    def retry(self, job_id: str):
+        """
+        Puts a failed job back on the queue. Its checkpoint is kept, so it resumes from the last completed stage.
+        """
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?",
+            (JobStatus.PENDING, time.time(), job_id, JobStatus.FAILED),
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = (
+            self._conn()
+            .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return _row_to_job(row) if row else None
+
+    def list(
+        self, env: Optional[str] = None, status: Optional[str] = None
+    ) -> list[Job]:
+        query = "SELECT * FROM jobs WHERE 1 = 1"
+        params: list[Any] = []
+        if env:
+            query += " AND env = ?"
+            params.append(env)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY created"
+        return [_row_to_job(row) for row in self._conn().execute(query, params)]
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        env=row["env"],
+        params=json.loads(row["params"]),
+        status=row["status"],
+        stage=row["stage"],
+        state=json.loads(row["state"]),
+        result=json.loads(row["result"]) if row["result"] else None,
+        error=row["error"],
+        attempts=row["attempts"],
+        worker=row["worker"],
+        created=row["created"],
+        updated=row["updated"],
+    )
+
+
+def run_workers(
+    queue: JobQueue,
+    env: str,
+    handlers: dict[str, Callable[[dict, Checkpoint], Any]],
+    concurrency: int = 4,
+    follow: bool = False,
+    idle_poll_seconds: int = 10,
+):
+    """
+    Runs a pool of workers against the queue until it is drained, or forever if follow is set.
+    :param queue: Queue to pull jobs from
+    :param env: Terra environment; only jobs enqueued for this environment are claimed
+    :param handlers: Mapping of job kind to the function that executes it
+    :param concurrency: Number of jobs to run at once
+    :param follow: Keep waiting for new jobs once the queue is empty
+    :param idle_poll_seconds: How often to check for new jobs when following an empty queue
+    """
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    # job id -> id of the worker running it
+    active: dict[str, str] = {}
+    active_lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeater():
+        while not stop.wait(queue.lease_seconds / 3):
+            with active_lock:
+                leases = list(active.items())
+            if leases:
+                queue.heartbeat(leases)
+
+    def worker(n: int):
+        worker_id = f"{worker_prefix}:{n}"
+        while True:
+            job = queue.claim(env, worker_id)
+            if job is None:
+                if not follow:
+                    return
+                time.sleep(idle_poll_seconds)
+                continue
+
+            with active_lock:
+                active[job.id] = worker_id
+            try:
+                _run_job(queue, job, worker_id, handlers)
+            finally:
+                with active_lock:
+                    active.pop(job.id, None)
+
+    heartbeat_thread = threading.Thread(target=heartbeater, daemon=True)
+    heartbeat_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker, n) for n in range(concurrency)]:
+                future.result()
+    finally:
+        stop.set()
+
+
+def _run_job(
+    queue: JobQueue,
+    job: Job,
+    worker_id: str,
+    handlers: dict[str, Callable[[dict, Checkpoint], Any]],
+):
+    try:
+        _execute_job(queue, job, worker_id, handlers)
+    except LeaseLostException as e:
+        logging.warning(
+            f"Abandoning job [id={job.id}, kind={job.kind}], its lease expired and it was reclaimed => {e}"
+        )
+
+
+def _execute_job(
+    queue: JobQueue,
+    job: Job,
+    worker_id: str,
+    handlers: dict[str, Callable[[dict, Checkpoint], Any]],
+):
+    handler = handlers.get(job.kind)
+    if handler is None:
+        queue.fail(job.id, worker_id, f"Unknown job kind {job.kind}")
+        return
+
+    resumed = f" from stage {job.stage}" if job.stage else ""
+    logging.info(
+        f"Starting job [id={job.id}, kind={job.kind}, attempt={job.attempts}]{resumed}"
+    )
+    checkpoint = Checkpoint(
+        job.state,
+        on_save=lambda stage, state: queue.save_checkpoint(
+            job.id, worker_id, stage, state
+        ),
+    )
+    try:
+        result = handler(job.params, checkpoint)
+    except LeaseLostException:
+        raise
+    except Exception as e:
+        logging.error(f"Job failed [id={job.id}, kind={job.kind}] => {e}")
+        queue.fail(job.id, worker_id, f"{e}")
+        return
+
+    queue.complete(job.id, worker_id, result)
+    logging.info(f"Job complete [id={job.id}, kind={job.kind}]")
@@ -0,0 +1,210 @@
+"""
+Incremental decoding of large JSON list responses.
+
+Yields the items of a JSON array one at a time as the response body streams in, optionally keeping only a subset
+of each item's fields, so that callers never hold the whole document in memory. Uses ijson when it is installed
+(the `ijson` extra, `poetry install -E ijson`) and falls back to an incremental decoder built on the standard
+library. Bodies that are already read, or small enough that streaming them gains nothing, are decoded with json.
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+import requests
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CHUNK_SIZE = 64 * 1024
+# (possibly compressed) bodies up to this size are decoded in one go
+SMALL_BODY_BYTES = 256 * 1024
+
+
+def iter_items(
+    response: requests.Response,
+    path: str = "",
+    fields: Optional[Iterable[str]] = None,
+) -> Iterator[Any]:
+    """
+    Iterates over the items of a JSON array in the response body. The response should have been requested
+    with stream=True, otherwise the body has already been read in full.
+    :param response: Response whose body contains the array
+    :param path: Dotted path of object keys leading to the array, or "" if the body is the array itself
+    :param fields: Dotted field paths to keep from each item; all fields are kept if not supplied
+    """
+    if _is_small(response):
+        items = _iter_items_loaded(response, path)
+    elif ijson is not None:
+        prefix = f"{path}.item" if path else "item"
+        items = ijson.items(
+            _ChunkReader(response.iter_content(chunk_size=CHUNK_SIZE)),
+            prefix,
+            use_float=True,
+        )
+    else:
+        items = _iter_items_stdlib(response, path)
+
+    for item in items:
+        yield project(item, fields) if fields else item
+
+
+def _is_small(response: requests.Response) -> bool:
+    if getattr(response, "_content_consumed", False):
+        return True
+    length = response.headers.get("Content-Length")
+    return length is not None and length.isdigit() and int(length) <= SMALL_BODY_BYTES
+
+
+def _iter_items_loaded(response: requests.Response, path: str) -> Iterator[Any]:
+    data = response.json()
+    for key in path.split(".") if path else []:
+        if not isinstance(data, dict) or key not in data:
+            return
+        data = data[key]
+    yield from data
+
+
+def project(item: dict, fields: Iterable[str]) -> dict:
+    """
+    Keeps only the given dotted field paths of item, preserving their nesting.
+    """
+    projected: dict = {}
+    for field in fields:
+        value: Any = item
+        keys = field.split(".")
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return projected
+
+
+class _ChunkReader:
+    """
+    File-like view over the response's (decompressed) content chunks, for ijson.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+
+    def read(self, size: int = -1) -> bytes:
+        # ijson probes the stream type with read(0), which mustn't consume a chunk
+        if size == 0:
+            return b""
+        return next(self._chunks, b"")
+
+
+def _iter_items_stdlib(response: requests.Response, path: str) -> Iterator[Any]:
+    reader = _IncrementalReader(response.iter_content(chunk_size=CHUNK_SIZE))
+
+    for key in path.split(".") if path else []:
+        if not reader.find_key(key):
+            return
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode_value()
+        if reader.peek() == ",":
+            reader.advance()
+            continue
+        reader.expect("]")
+        return
+
+
+_DELIMITERS = frozenset(",:]} \t\r\n")
+
+
+class _IncrementalReader:
+    """
+    Minimal pull parser over a stream of text chunks. Values are decoded with json's raw_decode; when a value
+    runs off the end of the buffered text, more of the stream is read and decoding is retried.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._utf8.decode(b"", final=True)
+        else:
+            text = self._utf8.decode(chunk)
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def advance(self):
+        self._pos += 1
+
+    def expect(self, ch: str):
+        found = self.peek()
+        if found != ch:
+            raise json.JSONDecodeError(
+                f"Expected '{ch}', found '{found}'", self._buf, self._pos
+            )
+        self.advance()
+
+    def decode_value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number or literal cut off by the end of the buffer (e.g. "12." of "12.75") decodes as a shorter
+            # one, so it only counts once it is followed by a delimiter or the stream has ended
+            if (
+                self._buf[self._pos] not in '"[{'
+                and (end == len(self._buf) or self._buf[end] not in _DELIMITERS)
+                and self._fill()
+            ):
+                continue
+            self._pos = end
+            return value
+
+    def find_key(self, key: str) -> bool:
+        """
+        Advances into the object at the current position until just past the given key's ':'.
+        :return: False if the object has no such key
+        """
+        self.expect("{")
+        while True:
+            if self.peek() == "}":
+                self.advance()
+                return False
+            current = self.decode_value()
+            self.expect(":")
+            if current == key:
+                return True
+            self.decode_value()
+            if self.peek() == ",":
+                self.advance()
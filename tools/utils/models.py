@@ -0,0 +1,202 @@
+"""
+Typed models for the API responses the tools work with.
+
+Each model keeps only the fields the tools use, in a slotted dataclass, so that inventory-scale listings (thousands
+of projects, workspaces or managed apps) stay small in memory and field access is checked by mypy. Models are parsed
+once from the response JSON with from_json; FIELDS lists the dotted JSON paths a model reads, for use as a
+jsonstream/Rawls field projection.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import ClassVar, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class BillingProject:
+    FIELDS: ClassVar[list[str]] = [
+        "projectName",
+        "status",
+        "message",
+        "managedAppCoordinates",
+    ]
+
+    project_name: str
+    status: Optional[str] = None
+    message: Optional[str] = None
+    subscription_id: Optional[str] = None
+    managed_resource_group_id: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BillingProject":
+        coordinates = data.get("managedAppCoordinates") or {}
+        return cls(
+            project_name=data["projectName"],
+            status=data.get("status"),
+            message=data.get("message"),
+            subscription_id=coordinates.get("subscriptionId"),
+            managed_resource_group_id=coordinates.get("managedResourceGroupId"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Workspace:
+    FIELDS: ClassVar[list[str]] = [
+        "workspace.namespace",
+        "workspace.name",
+        "workspace.state",
+        "workspace.workspaceId",
+    ]
+
+    namespace: str
+    name: str
+    state: Optional[str] = None
+    workspace_id: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Workspace":
+        """
+        Parses a Rawls workspace response or listing entry, whose details are under "workspace".
+        """
+        workspace = data["workspace"]
+        return cls(
+            namespace=workspace["namespace"],
+            name=workspace["name"],
+            state=workspace.get("state"),
+            workspace_id=workspace.get("workspaceId"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ManagedApp:
+    FIELDS: ClassVar[list[str]] = [
+        "subscriptionId",
+        "tenantId",
+        "applicationDeploymentName",
+        "managedResourceGroupId",
+        "assigned",
+    ]
+
+    subscription_id: str
+    tenant_id: str
+    deployment_name: str
+    managed_resource_group_id: str
+    assigned: bool = False
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ManagedApp":
+        return cls(
+            subscription_id=data["subscriptionId"],
+            tenant_id=data["tenantId"],
+            deployment_name=data["applicationDeploymentName"],
+            managed_resource_group_id=data["managedResourceGroupId"],
+            assigned=data.get("assigned", False),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "subscriptionId": self.subscription_id,
+            "tenantId": self.tenant_id,
+            "applicationDeploymentName": self.deployment_name,
+            "managedResourceGroupId": self.managed_resource_group_id,
+            "assigned": self.assigned,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class BillingProfile:
+    FIELDS: ClassVar[list[str]] = [
+        "id",
+        "subscriptionId",
+        "managedResourceGroupId",
+        "tenantId",
+    ]
+
+    id: str
+    subscription_id: Optional[str] = None
+    managed_resource_group_id: Optional[str] = None
+    tenant_id: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BillingProfile":
+        return cls(
+            id=data["id"],
+            subscription_id=data.get("subscriptionId"),
+            managed_resource_group_id=data.get("managedResourceGroupId"),
+            tenant_id=data.get("tenantId"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class JobReport:
+    """
+    Status of an asynchronous LZ API job, from the jobReport (and errorReport, if any) of a job result.
+    """
+
+    id: str
+    status: str
+    submitted: Optional[str] = None
+    completed: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "JobReport":
+        job_report = data["jobReport"]
+        error_report = data.get("errorReport") or {}
+        return cls(
+            id=job_report["id"],
+            status=job_report["status"],
+            submitted=job_report.get("submitted"),
+            completed=job_report.get("completed"),
+            error=error_report.get("message"),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.status == "RUNNING"
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == "SUCCEEDED"
+
+    @property
+    def terminal(self) -> bool:
+        return not self.running
+
+
+@dataclass(frozen=True, slots=True)
+class ArmResource:
+    id: str
+    name: str
+    type: Optional[str] = None
+    provisioning_state: Optional[str] = None
+    created_time: Optional[datetime] = None
+
+    @property
+    def resource_group(self) -> str:
+        return self.id.split("/")[4]
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ArmResource":
+        properties = data.get("properties") or {}
+        created_time = data.get("createdTime")
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            type=data.get("type"),
+            provisioning_state=properties.get("provisioningState"),
+            created_time=datetime.fromisoformat(created_time) if created_time else None,
+        )
+
+    @classmethod
+    def from_sdk(cls, resource) -> "ArmResource":
+        """
+        Converts a resource listed by the azure SDK's ResourceManagementClient.
+        """
+        return cls(
+            id=resource.id,
+            name=resource.name,
+            type=resource.type,
+            provisioning_state=getattr(resource, "provisioning_state", None),
+            created_time=getattr(resource, "created_time", None),
+        )
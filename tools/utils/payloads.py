@@ -0,0 +1,121 @@
+"""
+URLs and request bodies of the Rawls, BPM, LZ and ARM calls, shared by the command line tools and the async client
+in aio/ so that both send exactly the same requests.
+"""
+
+import uuid
+
+ARM_HOST = "https://management.azure.com"
+
+MRG_NOT_READY_STATES = ["Accepted", "Creating"]
+MRG_FAILED_STATES = ["Failed", "Deleted", "Deleting"]
+MRG_READY_STATES = ["Succeeded", "Running", "Ready"]
+
+DEFAULT_NETWORK_PARAMETERS = [
+    {"key": "VNET_ADDRESS_SPACE", "value": "10.1.0.0/18"},
+    {"key": "AKS_SUBNET", "value": "10.1.0.0/22"},
+    {"key": "BATCH_SUBNET", "value": "10.1.4.0/22"},
+    {"key": "POSTGRESQL_SUBNET", "value": "10.1.8.0/22"},
+    {"key": "COMPUTE_SUBNET", "value": "10.1.12.0/22"},
+]
+
+
+def managed_application_url(
+    subscription_id: str, resource_group: str, deployment_name: str, api_version: str
+) -> str:
+    return f"{ARM_HOST}/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Solutions/applications/{deployment_name}?api-version={api_version}"
+
+
+def managed_application_request(
+    subscription_id: str,
+    deployment_name: str,
+    authorized_terra_users: list[str],
+    plan: str,
+    location: str = "southcentralus",
+) -> dict:
+    """
+    Builds the body of a managed application deployment whose managed resource group is named after the deployment.
+    """
+    return {
+        "location": location,
+        "plan": plan,
+        "kind": "MarketPlace",
+        "properties": {
+            "managedResourceGroupId": f"/subscriptions/{subscription_id}/resourceGroups/{deployment_name}",
+            "parameters": {
+                "authorizedTerraUser": {"value": ",".join(authorized_terra_users)},
+                "location": {"value": location},
+            },
+        },
+    }
+
+
+def billing_project_request(
+    billing_project_name: str,
+    subscription_id: str,
+    tenant_id: str,
+    protected_data: bool,
+) -> dict:
+    """
+    Builds the body of a Rawls billing project creation on the MRG named after the project.
+    """
+    return {
+        "projectName": billing_project_name,
+        "managedAppCoordinates": {
+            "tenantId": tenant_id,
+            "subscriptionId": subscription_id,
+            "managedResourceGroupId": billing_project_name,
+        },
+        "protectedData": protected_data,
+    }
+
+
+def billing_profile_request(
+    subscription_id: str, managed_resource_group_id: str, tenant_id: str
+) -> dict:
+    """
+    Builds the body of a BPM billing profile creation, with a fresh profile id.
+    """
+    return {
+        "id": f"{uuid.uuid4()}",
+        "biller": "direct",
+        "displayName": "string",
+        "description": "string",
+        "cloudPlatform": "AZURE",
+        "tenantId": tenant_id,
+        "subscriptionId": subscription_id,
+        "managedResourceGroupId": managed_resource_group_id,
+    }
+
+
+def landing_zone_request(
+    billing_profile_id: str,
+    definition: str,
+    network_parameters: list[dict] | None = None,
+) -> dict:
+    """
+    Builds the body of a landing zone creation request, with fresh landing zone and job control ids.
+    :param network_parameters: VNet and subnet parameters, see ipam.landing_zone_network_parameters; defaults to
+    the same address space for every landing zone
+    """
+    return {
+        "landingZoneId": f"{uuid.uuid4()}",
+        "definition": definition,
+        "version": "v1",
+        "parameters": (network_parameters or DEFAULT_NETWORK_PARAMETERS)
+        + [
+            {"key": "AKS_AUTOSCALING_ENABLED", "value": "true"},
+            {"key": "AKS_AUTOSCALING_MIN", "value": "1"},
+            {"key": "AKS_AUTOSCALING_MAX", "value": "100"},
+            {"key": "AKS_MACHINE_TYPE", "value": "Standard_D4as_v5"},
+        ],
+        "billingProfileId": billing_profile_id,
+        "jobControl": {"id": f"{uuid.uuid4()}"},
+    }
+
+
+def landing_zone_deletion_request() -> dict:
+    """
+    Builds the body of a landing zone deletion request, with a fresh job control id.
+    """
+    return {"jobControl": {"id": f"{uuid.uuid4()}"}}
@@ -1,34 +1,149 @@
 import logging
-import sys
 import time
-from typing import Any
+from typing import Any, Callable, Optional
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
-)
+from utils import history, http, profiling, progress
+from utils.history import PollSchedule
+
+
+def sleep(seconds: float):
+    """
+    Sleeps between polls. When replaying recorded HTTP sessions, waits are scaled by the replay speed.
+    """
+    speed = http.replay_speed()
+    if speed > 0:
+        time.sleep(seconds / speed)
+
+
+class PollLoop:
+    """
+    Bookkeeping of a wait shared by poll_predicate and its coroutine counterpart in aio.poll: the poll schedule,
+    progress reporting, duration history and the timeout. Callers only poll and sleep.
+
+        with PollLoop(name, max_wait, interval) as loop:
+            while loop.running():
+                status, result = poll_fn()
+                if status:
+                    return loop.succeeded(status, result)
+                loop.waited(sleep_for(loop.next_interval(result)))
+        raise loop.timed_out()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_wait_time_seconds: int,
+        poll_interval_seconds: int,
+        next_interval_fn: Optional[Callable[[Any], Optional[float]]] = None,
+        history_key: Optional[str] = None,
+    ):
+        self.name = name
+        self.max_wait_time_seconds = max_wait_time_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.next_interval_fn = next_interval_fn
+        self.history_key = history_key
+        self.time_waited = 0.0
+        self.schedule = PollSchedule(
+            history.get_durations(history_key) if history_key else [],
+            poll_interval_seconds,
+        )
+        self._state = "timed_out"
+
+    def __enter__(self) -> "PollLoop":
+        self.start = time.monotonic()
+        logging.info("Waiting for %s", self.name)
+        self._op_id = progress.REPORTER.start(self.name, self.history_key)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._state = "failed"
+        progress.REPORTER.finish(self._op_id, self._state)
+
+    def running(self) -> bool:
+        if self.time_waited < self.max_wait_time_seconds:
+            logging.debug("Polling on %s...", self.name)
+            return True
+        return False
+
+    def succeeded(self, status: Any, result: Any) -> tuple[Any, Any]:
+        self._state = "succeeded"
+        elapsed = time.monotonic() - self.start
+        logging.info("%s is successful after %.0fs", self.name, elapsed)
+        if self.history_key and not http.is_replaying():
+            history.record_duration(self.history_key, elapsed)
+        return status, result
+
+    def next_interval(self, result: Any) -> float:
+        """
+        :return: How long to sleep before the next poll, after an incomplete poll returning result
+        """
+        interval = self.next_interval_fn(result) if self.next_interval_fn else None
+        if interval is None:
+            interval = self.schedule.next_interval(self.time_waited)
+        else:
+            interval = max(interval, self.poll_interval_seconds)
+
+        eta = self.schedule.eta_seconds(self.time_waited)
+        progress.REPORTER.update(self._op_id, progress.describe_state(result), eta)
+        logging.debug(
+            "%s not complete (ETA %s), scheduling retry in %ss...",
+            self.name,
+            "unknown" if eta is None else f"~{eta:.0f}s",
+            interval,
+        )
+        return interval
+
+    def waited(self, seconds: float):
+        self.time_waited += seconds
+
+    def timed_out(self) -> Exception:
+        return Exception(
+            f"Exceeded max wait time of {self.max_wait_time_seconds} polling for status of {self.name}"
+        )
 
 
 def poll_predicate(
-    name: str, max_wait_time_seconds: int, poll_interval_seconds: int, poll_fn
+    name: str,
+    max_wait_time_seconds: int,
+    poll_interval_seconds: int,
+    poll_fn,
+    next_interval_fn: Optional[Callable[[Any], Optional[float]]] = None,
+    history_key: Optional[str] = None,
+    initial_wait_seconds: float = 0,
 ) -> tuple[Any, Any]:
     """
     Polls on the given polling fn for max_wait_time_seconds, every poll_interval_seconds, until the job is reported
-    completed or we time out.
-    """
-    time_waited = 0
+    completed or we time out. If next_interval_fn is supplied, it is called with the result of each incomplete poll
+    and may return a server-suggested interval (e.g. from a Retry-After header) to use instead; suggestions shorter
+    than poll_interval_seconds are raised to it, so a Retry-After of 0 doesn't turn the wait into a busy loop.
+    initial_wait_seconds is slept before the first poll and counts towards max_wait_time_seconds.
 
-    while time_waited < max_wait_time_seconds:
-        logging.info(f"Polling on {name}...")
-        (status, result) = poll_fn()
+    If history_key is supplied, the time the operation takes is recorded under that key, and previously recorded
+    durations are used to space out polls and to report an ETA.
 
-        if status:
-            logging.info(f"{name} is successful")
-            return status, result
+    Individual polls are only logged at debug level; the wait is tracked by the progress reporter, which
+    periodically summarizes all active waits.
+    """
+    with PollLoop(
+        name,
+        max_wait_time_seconds,
+        poll_interval_seconds,
+        next_interval_fn,
+        history_key,
+    ) as loop:
+        if initial_wait_seconds > 0:
+            with profiling.phase("poll wait", name):
+                sleep(initial_wait_seconds)
+            loop.waited(initial_wait_seconds)
+        while loop.running():
+            (status, result) = poll_fn()
+            if status:
+                return loop.succeeded(status, result)
 
-        logging.info(f"{name} not complete, scheduling retry...")
-        time.sleep(poll_interval_seconds)
-        time_waited += poll_interval_seconds
+            interval = loop.next_interval(result)
+            with profiling.phase("poll wait", name):
+                sleep(interval)
+            loop.waited(interval)
 
-    raise Exception(
-        f"Exceeded max wait time of {max_wait_time_seconds} polling for status of {name}"
-    )
+    raise loop.timed_out()
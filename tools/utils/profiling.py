@@ -0,0 +1,170 @@
+"""
+Profiling mode for the command line tools (--profile).
+
+Captures a cProfile CPU profile of the main thread and of every thread started after profiling began (the
+run_concurrently workers, the ARM batcher, ...), merged into one, plus a wall-clock breakdown by phase: process
+startup and imports, auth token fetches, every HTTP call (via a response hook on the shared sessions) and the time spent
+sleeping between polls. At exit the CPU profile is written as a pstats file and the breakdown, with the hottest
+functions, as a readable summary next to it.
+"""
+
+import atexit
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+SLOWEST_ITEMS = 10
+HOT_FUNCTIONS = 25
+
+_profiler: Optional["Profiler"] = None
+
+
+class Profiler:
+    def __init__(self, output_prefix: str):
+        self.output_prefix = output_prefix
+        self.cpu = cProfile.Profile()
+        self._thread_cpu: list[cProfile.Profile] = []
+        self.started = time.monotonic()
+        self.startup_seconds = _process_age_seconds()
+        self._lock = threading.Lock()
+        self._phases: dict[str, dict[str, list[float]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+
+    def profile_thread(self, *args):
+        """
+        Profile hook threading installs in each new thread: replaces itself with a CPU profiler of that thread.
+        """
+        sys.setprofile(None)
+        cpu = cProfile.Profile()
+        with self._lock:
+            self._thread_cpu.append(cpu)
+        cpu.enable()
+
+    def cpu_stats(self, stream=None) -> pstats.Stats:
+        """
+        The CPU profiles of all threads, merged.
+        """
+        stats = pstats.Stats(self.cpu, stream=stream)
+        with self._lock:
+            thread_cpu = list(self._thread_cpu)
+        for cpu in thread_cpu:
+            # threads that never made a call have nothing to add
+            cpu.create_stats()
+            if cpu.stats:
+                stats.add(cpu)
+        return stats
+
+    def record(self, category: str, detail: str, seconds: float):
+        with self._lock:
+            self._phases[category][detail].append(seconds)
+
+    def summary(self) -> str:
+        total = time.monotonic() - self.started
+        lines = [f"Wall time after startup: {total:.2f}s"]
+        if self.startup_seconds is not None:
+            lines.append(f"Startup and imports: {self.startup_seconds:.2f}s")
+
+        with self._lock:
+            phases = {c: dict(details) for c, details in self._phases.items()}
+        for category, details in sorted(phases.items()):
+            durations = [d for ds in details.values() for d in ds]
+            lines.append(
+                f"\n{category}: {len(durations)} calls, {sum(durations):.2f}s total"
+            )
+            slowest = sorted(details.items(), key=lambda kv: -sum(kv[1]))
+            for detail, ds in slowest[:SLOWEST_ITEMS]:
+                lines.append(
+                    f"  {sum(ds):8.2f}s  {len(ds):5d}x  max {max(ds):6.2f}s  {detail}"
+                )
+        lines.append(
+            "\n(phases running concurrently on worker threads overlap, so their sums can exceed the wall time)"
+        )
+
+        out = io.StringIO()
+        stats = self.cpu_stats(stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(HOT_FUNCTIONS)
+        lines.append("\nCPU profile of all threads, by cumulative time:")
+        lines.append(out.getvalue())
+        return "\n".join(lines)
+
+    def finish(self):
+        self.cpu.disable()
+        threading.setprofile(None)
+        self.cpu_stats().dump_stats(f"{self.output_prefix}.pstats")
+        summary = self.summary()
+        with open(f"{self.output_prefix}.txt", mode="w") as f:
+            f.write(summary)
+        logging.info(
+            f"Profile written to {self.output_prefix}.pstats and {self.output_prefix}.txt\n{summary}"
+        )
+
+
+def enable(output_prefix: str):
+    """
+    Starts profiling; the results are written when the process exits.
+    :param output_prefix: Path prefix of the .pstats and .txt files to write
+    """
+    global _profiler
+    _profiler = Profiler(output_prefix)
+    atexit.register(_profiler.finish)
+    threading.setprofile(_profiler.profile_thread)
+    _profiler.cpu.enable()
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+@contextmanager
+def phase(category: str, detail: str) -> Iterator[None]:
+    """
+    Times the enclosed block as part of the given phase; does nothing unless profiling is enabled.
+    """
+    if _profiler is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _profiler.record(category, detail, time.monotonic() - start)
+
+
+def record_http(response: requests.Response, *args, **kwargs):
+    """
+    Session response hook recording each HTTP call, by method, host and path.
+    """
+    if _profiler is not None:
+        url = urlsplit(response.request.url or "")
+        _profiler.record(
+            "http",
+            f"{response.request.method} {url.netloc}{url.path}",
+            response.elapsed.total_seconds(),
+        )
+
+
+def _process_age_seconds() -> Optional[float]:
+    """
+    How long ago the process started, from /proc; None where that isn't available.
+    """
+    try:
+        with open("/proc/self/stat", mode="r") as f:
+            # fields after the parenthesized command name start at field 3; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", mode="r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
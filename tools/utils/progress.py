@@ -0,0 +1,168 @@
+"""
+Aggregated progress reporting for long-running waits.
+
+Every wait in poll.poll_predicate is tracked here. Instead of logging each poll, a background thread logs a
+periodic summary of all active operations (counts by state and the slowest ones), and every start, poll and
+finish can be written to a machine-readable JSONL event stream.
+"""
+
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Optional, TextIO
+
+SUMMARY_INTERVAL_SECONDS = 60.0
+SLOWEST_ITEMS = 3
+
+
+@dataclass
+class TrackedOperation:
+    id: int
+    name: str
+    kind: Optional[str]
+    started: float
+    state: str = "waiting"
+    polls: int = 0
+    eta_seconds: Optional[float] = None
+    finished: Optional[float] = None
+
+
+class ProgressReporter:
+    def __init__(
+        self,
+        summary_interval_seconds: float = SUMMARY_INTERVAL_SECONDS,
+        events: Optional[TextIO] = None,
+    ):
+        self.summary_interval_seconds = summary_interval_seconds
+        self._events = events
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._active: dict[int, TrackedOperation] = {}
+        self._finished: Counter = Counter()
+        self._summarizer: Optional[threading.Thread] = None
+
+    def start(self, name: str, kind: Optional[str] = None) -> int:
+        with self._lock:
+            op = TrackedOperation(next(self._ids), name, kind, time.monotonic())
+            self._active[op.id] = op
+            if self._summarizer is None:
+                self._summarizer = threading.Thread(target=self._summarize, daemon=True)
+                self._summarizer.start()
+        self._emit("start", op)
+        return op.id
+
+    def update(self, op_id: int, state: str, eta_seconds: Optional[float] = None):
+        with self._lock:
+            op = self._active[op_id]
+            op.state = state
+            op.polls += 1
+            op.eta_seconds = eta_seconds
+        self._emit("poll", op)
+
+    def finish(self, op_id: int, state: str):
+        with self._lock:
+            op = self._active.pop(op_id)
+            op.state = state
+            op.finished = time.monotonic()
+            self._finished[state] += 1
+        self._emit("finish", op)
+
+    def summary(self) -> Optional[str]:
+        """
+        One-line summary of the active operations, or None if there are none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            active = list(self._active.values())
+            finished = dict(self._finished)
+        if not active:
+            return None
+
+        states = Counter(op.state for op in active)
+        slowest = sorted(active, key=lambda op: op.started)[:SLOWEST_ITEMS]
+        return "{} active ({}); finished: {}; slowest: {}".format(
+            len(active),
+            ", ".join(f"{state}: {n}" for state, n in states.most_common()),
+            ", ".join(f"{state}: {n}" for state, n in finished.items()) or "none",
+            ", ".join(_describe(op, now) for op in slowest),
+        )
+
+    def _summarize(self):
+        while True:
+            time.sleep(self.summary_interval_seconds)
+            summary = self.summary()
+            if summary:
+                logging.info(summary)
+                self._write({"event": "summary", "summary": summary})
+
+    def _emit(self, event: str, op: TrackedOperation):
+        if self._events is None:
+            return
+        end = op.finished if op.finished is not None else time.monotonic()
+        self._write(
+            {
+                "event": event,
+                "id": op.id,
+                "name": op.name,
+                "kind": op.kind,
+                "state": op.state,
+                "polls": op.polls,
+                "elapsed_seconds": round(end - op.started, 3),
+                "eta_seconds": op.eta_seconds,
+            }
+        )
+
+    def _write(self, record: dict):
+        if self._events is None:
+            return
+        record["ts"] = time.time()
+        with self._lock:
+            self._events.write(json.dumps(record) + "\n")
+            self._events.flush()
+
+
+def _describe(op: TrackedOperation, now: float) -> str:
+    eta = f", ETA ~{op.eta_seconds:.0f}s" if op.eta_seconds is not None else ""
+    return f"{op.name} [{op.state}, {now - op.started:.0f}s{eta}]"
+
+
+def describe_state(result: Any) -> str:
+    """
+    Best-effort name for the state a poll observed, from the shapes of result (JSON or models) the pollers return.
+    """
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        if isinstance(result.get("status"), str):
+            return result["status"]
+        job_report = result.get("jobReport")
+        if isinstance(job_report, dict) and "status" in job_report:
+            return job_report["status"]
+        properties = result.get("properties")
+        if isinstance(properties, dict) and "provisioningState" in properties:
+            return properties["provisioningState"]
+    for attr in ("status", "state", "provisioning_state"):
+        if isinstance(getattr(result, attr, None), str):
+            return getattr(result, attr)
+    return "waiting"
+
+
+REPORTER = ProgressReporter()
+
+
+def configure(
+    summary_interval_seconds: float = SUMMARY_INTERVAL_SECONDS,
+    events_path: Optional[str] = None,
+):
+    """
+    Replaces the process-wide reporter; call before any waits start.
+    :param summary_interval_seconds: How often to log the summary of active operations
+    :param events_path: File to append the JSONL event stream to, if any
+    """
+    global REPORTER
+    events = open(events_path, mode="a") if events_path else None
+    REPORTER = ProgressReporter(summary_interval_seconds, events)
@@ -0,0 +1,148 @@
+"""
+Sharding of bulk operations across machines.
+
+`--shard i/N` restricts a bulk command to the resources that hash to shard i of N, so N workers on different nodes
+can split a manifest between them without ever touching the same resource. Resources are assigned with consistent
+hashing (each shard owns many points on a hash ring), so re-running with a different N moves as few resources as
+possible between shards. Each shard can write a JSON report of its results; `shards.py merge` combines them.
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable, Optional, TypeVar
+
+from utils.bulk import BulkResult
+
+T = TypeVar("T")
+
+# points per shard on the hash ring; more points spread resources more evenly
+VIRTUAL_NODES = 128
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def owns(self, key: str) -> bool:
+        return shard_for(key, self.count) == self.index
+
+
+def parse_shard(value: str) -> Shard:
+    """
+    Parses "i/N" (0 <= i < N), for use as an argparse type.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Shard must be of the form i/N, {value} found"
+        )
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(
+            f"Shard index must be in [0, N), {value} found"
+        )
+    return Shard(index, count)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "big")
+
+
+@lru_cache(maxsize=None)
+def _ring(count: int) -> tuple[list[int], list[int]]:
+    points = sorted(
+        (_hash(f"shard-{shard}-{node}"), shard)
+        for shard in range(count)
+        for node in range(VIRTUAL_NODES)
+    )
+    return [p for p, _ in points], [s for _, s in points]
+
+
+def shard_for(key: str, count: int) -> int:
+    """
+    The shard owning key: the shard of the first ring point at or after the key's hash, wrapping around.
+    """
+    hashes, shards = _ring(count)
+    return shards[bisect.bisect_left(hashes, _hash(key)) % len(hashes)]
+
+
+def select(
+    items: Iterable[T], key_fn: Callable[[T], str], shard: Optional[Shard]
+) -> list[T]:
+    """
+    The items owned by the shard, or all of them if no shard is given.
+    """
+    if shard is None:
+        return list(items)
+    return [item for item in items if shard.owns(key_fn(item))]
+
+
+def bulk_entries(
+    results: list[BulkResult[T]], key_fn: Callable[[T], str]
+) -> list[dict]:
+    """
+    Report entries for the results of run_concurrently.
+    :param key_fn: The resource name of an item, as used for sharding
+    """
+    return [
+        {
+            "resource": key_fn(r.item),
+            "status": "succeeded" if r.succeeded else "failed",
+            "error": f"{r.error}" if r.error else None,
+            "elapsed_seconds": round(r.elapsed_seconds, 3),
+        }
+        for r in results
+    ]
+
+
+def write_report(path: str, command: str, shard: Optional[Shard], entries: list[dict]):
+    """
+    Writes the results of a (possibly sharded) bulk command as a JSON report for `shards.py merge`.
+    :param entries: One {resource, status, error, elapsed_seconds} dict per resource
+    """
+    report = {
+        "command": command,
+        "shard": f"{shard or Shard(0, 1)}",
+        "results": entries,
+    }
+    with open(path, mode="w") as f:
+        json.dump(report, f, indent=2)
+
+
+def merge_reports(paths: list[str]) -> dict:
+    """
+    Combines per-shard reports of one command into a single report, noting shards without a report.
+    """
+    reports = []
+    for path in paths:
+        with open(path, mode="r") as f:
+            reports.append(json.load(f))
+
+    commands = {r["command"] for r in reports}
+    shards = [parse_shard(r["shard"]) for r in reports]
+    counts = {s.count for s in shards}
+    if len(commands) > 1 or len(counts) > 1:
+        raise ValueError(
+            f"Reports must come from shards of one command, found commands {sorted(commands)} with shard counts {sorted(counts)}"
+        )
+
+    count = counts.pop() if counts else 0
+    seen = {s.index for s in shards}
+    return {
+        "command": commands.pop() if commands else None,
+        "shards": count,
+        "missing_shards": [f"{i}/{count}" for i in range(count) if i not in seen],
+        "results": [
+            {**result, "shard": report["shard"]}
+            for report in reports
+            for result in report["results"]
+        ],
+    }
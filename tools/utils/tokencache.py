@@ -0,0 +1,89 @@
+"""
+On-disk access token cache shared by concurrent processes.
+
+Tokens are stored in a JSON file readable only by its owner, keyed by a hash of the identity and scopes they were
+issued for. Lookups and refreshes happen under an exclusive lock on a companion lock file, so when many processes
+start at once the first one refreshes the token and the rest wait for it and then read it from the cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
+
+TOKEN_CACHE_PATH = os.path.expanduser("~/.terra-tools/tokens.json")
+
+# tokens this close to expiry are refreshed rather than handed out
+EXPIRY_MARGIN_SECONDS = 300
+
+
+def cache_key(identity: str, scopes: Iterable[str]) -> str:
+    return hashlib.sha256(
+        f"{identity}|{' '.join(sorted(scopes))}".encode("utf-8")
+    ).hexdigest()
+
+
+def get_or_refresh(
+    key: str,
+    refresh_fn: Callable[[], tuple[str, int]],
+    path: str = TOKEN_CACHE_PATH,
+) -> tuple[str, int]:
+    """
+    Returns the cached token for key if it is not about to expire, otherwise calls refresh_fn and caches its result.
+    :param key: Cache key, see cache_key
+    :param refresh_fn: Returns a fresh token and its expiry as a unix timestamp
+    :param path: Cache file
+    :return: The token and its expiry
+    """
+    if fcntl is None:
+        return refresh_fn()
+
+    with _locked(path):
+        tokens = _read(path)
+        cached = tokens.get(key)
+        if cached and cached["expires_on"] - EXPIRY_MARGIN_SECONDS > time.time():
+            return cached["token"], cached["expires_on"]
+
+        token, expires_on = refresh_fn()
+        tokens = {k: v for k, v in tokens.items() if v["expires_on"] > time.time()}
+        tokens[key] = {"token": token, "expires_on": expires_on}
+        _write(path, tokens)
+        return token, expires_on
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path, mode="r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable token cache {path} => {e}")
+        return {}
+
+
+def _write(path: str, tokens: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, mode="w") as f:
+        json.dump(tokens, f)
+    os.replace(tmp_path, path)
@@ -3,26 +3,41 @@ Utility functions for working with Terra workspaces.
 """
 
 import argparse
+import csv
 import requests
 import logging
 import sys
 import json
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator
 
 from requests import HTTPError
+from tabulate import tabulate
 
-from utils import auth, poll, cli
+from utils import auth, poll, cli, shard
+from utils.bulk import run_concurrently
 from utils.conf import Configuration
 from utils.http import get_session_with_retry
+from utils.jsonstream import iter_items, project
+from utils.models import Workspace
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stdout
 )
 
+# while at most this many workspaces are still creating, they are probed one by one rather than by listing them all
+MAX_PROBED_WORKSPACES = 5
 
-def get_workspace_by_id(id: str, session: requests.Session):
+
+def get_workspace_by_id(
+    id: str, session: requests.Session, fields: list[str] | None = None
+):
     """
     Gets the workspace from rawls
     :param id:
+    :param fields: Fields for rawls to return, or None for the whole workspace
     :return:
     """
     rawls_host = Configuration.get_config()["rawls_host"]
@@ -30,18 +45,24 @@ def get_workspace_by_id(id: str, session: requests.Session):
     token = auth.get_gcp_token()
 
     headers = auth.build_auth_headers(token)
-    workspace_response = session.get(url=url, headers=headers)
+    workspace_response = session.get(
+        url=url, headers=headers, params=_fields_param(fields)
+    )
 
     return workspace_response
 
 
 def get_workspace_by_name(
-    workspace_name: str, billing_project_name: str, session: requests.Session
+    workspace_name: str,
+    billing_project_name: str,
+    session: requests.Session,
+    fields: list[str] | None = None,
 ):
     """
     Gets the workspace from rawls
     :param workspace_name:
     :param billing_project_name:
+    :param fields: Fields for rawls to return, or None for the whole workspace
     :return:
     """
     rawls_host = Configuration.get_config()["rawls_host"]
@@ -49,11 +70,245 @@ def get_workspace_by_name(
     token = auth.get_gcp_token()
 
     headers = auth.build_auth_headers(token)
-    workspace_response = session.get(url=url, headers=headers)
+    workspace_response = session.get(
+        url=url, headers=headers, params=_fields_param(fields)
+    )
 
     return workspace_response
 
 
+def get_workspace_status(
+    workspace_name: str, billing_project_name: str, session: requests.Session
+) -> Workspace | None:
+    """
+    Lightweight probe of a workspace's state for pollers: only the fields of the Workspace model are fetched,
+    and the response is parsed once.
+    :return: The workspace, or None if it doesn't exist
+    """
+    response = get_workspace_by_name(
+        workspace_name, billing_project_name, session, Workspace.FIELDS
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+
+    data = response.json()
+    if "workspace" not in data:
+        logging.info(data)
+        raise Exception("Invalid workspace response")
+    return Workspace.from_json(data)
+
+
+def _fields_param(fields: list[str] | None) -> dict:
+    return {"fields": ",".join(fields)} if fields else {}
+
+
+def list_workspaces(
+    session: requests.Session, billing_project_name: str | None = None
+) -> list[Workspace]:
+    """
+    Lists the workspaces the caller has access to, optionally restricted to a single billing project
+    :param session:
+    :param billing_project_name:
+    :return: List of workspaces
+    """
+    return [
+        Workspace.from_json(entry)
+        for entry in iter_workspaces(session, Workspace.FIELDS, billing_project_name)
+    ]
+
+
+def iter_workspaces(
+    session: requests.Session,
+    fields: list[str],
+    billing_project_name: str | None = None,
+) -> Iterator[dict]:
+    """
+    Streams the workspace listing entries the caller has access to, one at a time. Rawls only returns the
+    requested fields, so listing thousands of workspaces transfers a fraction of the full documents.
+    :param session:
+    :param fields: Dotted listing fields to return, e.g. "workspace.name" or "accessLevel"
+    :param billing_project_name: Only return workspaces in this billing project
+    :return: Listing entries holding only the requested fields
+    """
+    rawls_host = Configuration.get_config()["rawls_host"]
+    url = f"{rawls_host}/api/workspaces"
+    token = auth.get_gcp_token()
+
+    # rawls can't filter by billing project, so the namespace is needed to filter locally
+    projection = list(fields)
+    if billing_project_name and "workspace.namespace" not in projection:
+        projection.append("workspace.namespace")
+
+    with session.get(
+        url=url,
+        headers=auth.build_auth_headers(token),
+        params=_fields_param(projection),
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        for entry in iter_items(response):
+            if (
+                billing_project_name
+                and entry.get("workspace", {}).get("namespace") != billing_project_name
+            ):
+                continue
+            yield project(entry, fields)
+
+
+def _is_settled(workspace: Workspace) -> bool:
+    # rawls may not report a state yet for a workspace it has only just recorded
+    return workspace.state not in (None, "Creating")
+
+
+@dataclass
+class WorkspaceCreation:
+    name: str
+    state: str | None = None
+    create_seconds: float | None = None
+    ready_seconds: float | None = None
+    error: str | None = None
+
+
+def create_workspace(
+    workspace_name: str,
+    billing_project_name: str,
+    session: requests.Session | None = None,
+) -> Workspace:
+    """
+    Creates a workspace in the billing project. Rawls returns once the workspace is recorded; it may still be
+    Creating, see wait_for_workspaces.
+    :return: The workspace as returned by rawls
+    """
+    if session is None:
+        session = get_session_with_retry()
+
+    rawls_host = Configuration.get_config()["rawls_host"]
+    token = auth.get_gcp_token()
+    body = {
+        "namespace": billing_project_name,
+        "name": workspace_name,
+        "attributes": {},
+    }
+    response = session.post(
+        url=f"{rawls_host}/api/workspaces",
+        headers=auth.build_auth_headers(token),
+        json=body,
+    )
+    response.raise_for_status()
+    return Workspace.from_json({"workspace": response.json()})
+
+
+def wait_for_workspaces(
+    billing_project_name: str,
+    workspace_names: list[str],
+    session: requests.Session,
+    max_wait_time_seconds: int = 1800,
+    settled: dict[str, tuple[Workspace, float]] | None = None,
+) -> dict[str, tuple[Workspace, float]]:
+    """
+    Waits until none of the workspaces is Creating any more. All of them are checked in one shared poll loop: while
+    only a few are left (MAX_PROBED_WORKSPACES) each is probed directly, before that a single listing call per
+    poll covers them all rather than a request per workspace.
+    :param settled: Filled in as workspaces settle, so that callers keep partial results if the wait times out
+    :return: Each workspace in its final state, with the time.monotonic() at which that was first seen
+    """
+    settled = {} if settled is None else settled
+    pending = set(workspace_names)
+
+    def creation_poller():
+        if len(pending) <= MAX_PROBED_WORKSPACES:
+            statuses = [
+                get_workspace_status(name, billing_project_name, session)
+                for name in pending
+            ]
+            workspaces = [status for status in statuses if status]
+        else:
+            workspaces = [
+                Workspace.from_json(entry)
+                for entry in iter_workspaces(
+                    session, Workspace.FIELDS, billing_project_name
+                )
+            ]
+
+        now = time.monotonic()
+        for workspace in workspaces:
+            if workspace.name in pending and _is_settled(workspace):
+                settled[workspace.name] = (workspace, now)
+                pending.discard(workspace.name)
+        done = len(workspace_names) - len(pending)
+        return not pending, f"{done}/{len(workspace_names)} settled"
+
+    poll.poll_predicate(
+        f"Creation of {len(workspace_names)} workspaces in {billing_project_name}",
+        max_wait_time_seconds,
+        5,
+        creation_poller,
+    )
+    return settled
+
+
+def bulk_create_workspaces(
+    billing_project_name: str,
+    workspace_names: list[str],
+    max_workers: int = 8,
+    max_wait_time_seconds: int = 1800,
+) -> list[WorkspaceCreation]:
+    """
+    Creates the workspaces with at most max_workers creation calls in flight, then waits for all of them to be
+    ready in one poll loop.
+    :return: Per-workspace outcome and timings (of the create call, and from the call until the workspace was
+    seen ready), in the order the names were supplied
+    """
+    session = get_session_with_retry(pool_size=max_workers)
+    started: dict[str, float] = {}
+
+    def create(name: str) -> Workspace:
+        started[name] = time.monotonic()
+        return create_workspace(name, billing_project_name, session)
+
+    results = run_concurrently(
+        workspace_names, create, max_workers, "Workspace creation", adaptive=True
+    )
+
+    creations = {}
+    settled: dict[str, tuple[Workspace, float]] = {}
+    for r in results:
+        creations[r.item] = WorkspaceCreation(
+            r.item,
+            create_seconds=r.elapsed_seconds,
+            error=f"{r.error}" if r.error else None,
+        )
+        if r.succeeded and _is_settled(r.result):
+            settled[r.item] = (r.result, started[r.item] + r.elapsed_seconds)
+
+    creating = [r.item for r in results if r.succeeded and r.item not in settled]
+    if creating:
+        try:
+            wait_for_workspaces(
+                billing_project_name,
+                creating,
+                session,
+                max_wait_time_seconds,
+                settled,
+            )
+        except Exception as e:
+            logging.error(f"Waiting for workspaces failed => {e}")
+
+    for name in [r.item for r in results if r.succeeded]:
+        creation = creations[name]
+        if name not in settled:
+            creation.error = "Timed out waiting for the workspace to be ready"
+            continue
+        workspace, settled_at = settled[name]
+        creation.state = workspace.state
+        creation.ready_seconds = settled_at - started[name]
+        if workspace.state != "Ready":
+            creation.error = f"Workspace state is {workspace.state}"
+
+    return [creations[name] for name in workspace_names]
+
+
 def delete_workspace(workspace_name: str, billing_project_name: str):
     """
     Deletes a workspace from the billing project.
@@ -65,17 +320,14 @@ def delete_workspace(workspace_name: str, billing_project_name: str):
     headers = auth.build_auth_headers(token)
 
     session = get_session_with_retry()
-    workspace_response = get_workspace_by_name(
-        workspace_name, billing_project_name, session
-    )
-    if workspace_response.status_code == 404:
+    workspace = get_workspace_status(workspace_name, billing_project_name, session)
+    if workspace is None:
         logging.info(
             f"Workspace {billing_project_name}/{workspace_name} is gone, skipping deletion."
         )
         return
 
-    workspace = workspace_response.json()
-    workspace_status = workspace["workspace"]["state"]
+    workspace_status = workspace.state
     if workspace_status in ["Ready", "DeleteFailed"]:
         logging.info(
             f"Workspace {billing_project_name}/{workspace_name} status is {workspace_status}, starting deletion"
@@ -92,27 +344,26 @@ def delete_workspace(workspace_name: str, billing_project_name: str):
         )
 
     def deletion_poller():
-        raw_status = get_workspace_by_name(
-            workspace_name, billing_project_name, session
-        )
-        if raw_status.status_code == 404:
+        workspace = get_workspace_status(workspace_name, billing_project_name, session)
+        if workspace is None:
             return True, None
 
-        if "workspace" not in raw_status.json():
-            logging.info(raw_status.json())
-            raise Exception("Invalid workspace response")
-
-        status = raw_status.json()["workspace"]["state"]
-        if status in ["Deleting"]:
-            return False, status
-        elif status in ["Deleted"]:
+        if workspace.state in ["Deleting"]:
+            return False, workspace.state
+        elif workspace.state in ["Deleted"]:
             return True, None
         else:
             raise Exception(
-                f"Error deleting workspace {billing_project_name}/{workspace_name}, id = {raw_status.json()['workspace']['workspaceId']} status = {status}"
+                f"Error deleting workspace {billing_project_name}/{workspace_name}, id = {workspace.workspace_id} status = {workspace.state}"
             )
 
-    poll.poll_predicate("Workspace deletion", 1200, 5, deletion_poller)
+    poll.poll_predicate(
+        "Workspace deletion",
+        1200,
+        5,
+        deletion_poller,
+        history_key="workspace_deletion",
+    )
     logging.info(
         f"Deletion of workspace {billing_project_name}/{workspace_name} complete"
     )
@@ -122,6 +373,158 @@ def _delete_workspace_cmd(args):
     delete_workspace(args.workspace_name, args.billing_project_name)
 
 
+def _create_workspace_cmd(args):
+    start = time.monotonic()
+    creations = bulk_create_workspaces(
+        args.billing_project_name, [args.workspace_name], 1, args.timeout
+    )
+    _report_creations(creations, start)
+
+
+def _bulk_create_workspaces_cmd(args):
+    if args.workspaces_file:
+        with open(args.workspaces_file, mode="r") as f:
+            names = [line.strip() for line in f if line.strip()]
+    elif args.template and args.count:
+        names = [
+            args.template.format(n=n)
+            for n in range(args.start, args.start + args.count)
+        ]
+    else:
+        logging.error("Must specify either a workspaces file or a template and count")
+        sys.exit(1)
+
+    if args.shard:
+        total = len(names)
+        names = shard.select(
+            names, lambda n: f"{args.billing_project_name}/{n}", args.shard
+        )
+        logging.info(f"Shard {args.shard} owns {len(names)} of {total} workspaces")
+
+    start = time.monotonic()
+    creations = bulk_create_workspaces(
+        args.billing_project_name, names, args.concurrency, args.timeout
+    )
+    if args.report:
+        shard.write_report(
+            args.report,
+            "workspace bulk_create",
+            args.shard,
+            [
+                {
+                    "resource": f"{args.billing_project_name}/{c.name}",
+                    "status": "failed" if c.error else "succeeded",
+                    "error": c.error,
+                    "elapsed_seconds": c.ready_seconds,
+                }
+                for c in creations
+            ],
+        )
+    _report_creations(creations, start)
+
+
+def _report_creations(creations: list[WorkspaceCreation], start: float):
+    rows = [
+        {
+            "Workspace": c.name,
+            "State": c.state,
+            "Create (s)": c.create_seconds,
+            "Ready (s)": c.ready_seconds,
+            "Error": c.error,
+        }
+        for c in creations
+    ]
+    logging.info("\n" + tabulate(rows, headers="keys", floatfmt=".1f"))
+
+    elapsed = time.monotonic() - start
+    ready = [c.ready_seconds for c in creations if not c.error and c.ready_seconds]
+    if ready:
+        logging.info(
+            f"{len(ready)} of {len(creations)} workspaces ready in {elapsed:.0f}s "
+            f"({len(ready) / elapsed * 60:.1f}/min); time to ready p50 {statistics.median(ready):.1f}s, max {max(ready):.1f}s"
+        )
+    if len(ready) < len(creations):
+        logging.error(f"{len(creations) - len(ready)} workspaces failed")
+        sys.exit(1)
+
+
+def _bulk_delete_workspaces_cmd(args):
+    workspaces = _parse_workspaces_file(args.workspaces_file)
+    if args.shard:
+        total = len(workspaces)
+        workspaces = shard.select(workspaces, "/".join, args.shard)
+        logging.info(f"Shard {args.shard} owns {len(workspaces)} of {total} workspaces")
+
+    results = run_concurrently(
+        workspaces,
+        lambda w: delete_workspace(w[1], w[0]),
+        max_workers=args.concurrency,
+        name="Workspace deletion",
+        adaptive=True,
+    )
+    if args.report:
+        shard.write_report(
+            args.report,
+            "workspace bulk_delete",
+            args.shard,
+            shard.bulk_entries(results, "/".join),
+        )
+
+    failures = [r for r in results if not r.succeeded]
+    logging.info(f"Deleted {len(results) - len(failures)} of {len(results)} workspaces")
+    if failures:
+        sys.exit(1)
+
+
+def _parse_workspaces_file(workspaces_file: str) -> list[tuple[str, str]]:
+    """
+    Reads a file of billing_project/workspace lines
+    """
+    workspaces = []
+    with open(workspaces_file, mode="r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            billing_project_name, workspace_name = line.strip().split("/")
+            workspaces.append((billing_project_name, workspace_name))
+    return workspaces
+
+
+def _list_workspaces_cmd(args):
+    if not args.output_file:
+        cli.log_to_stderr()
+    fields = _parse_fields(args.fields) or Workspace.FIELDS
+
+    output = open(args.output_file, mode="w") if args.output_file else sys.stdout
+    count = 0
+    try:
+        writer = csv.DictWriter(output, fieldnames=fields)
+        if args.output_format == "csv":
+            writer.writeheader()
+        for entry in iter_workspaces(
+            get_session_with_retry(), fields, args.billing_project_name
+        ):
+            if args.output_format == "jsonl":
+                output.write(json.dumps(entry) + "\n")
+            else:
+                writer.writerow({f: _lookup(entry, f) for f in fields})
+            count += 1
+    finally:
+        if args.output_file:
+            output.close()
+
+    logging.info(f"{count} workspaces listed")
+
+
+def _lookup(entry: dict, field: str) -> Any:
+    value: Any = entry
+    for key in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
 def _get_workspace_cmd(args):
     if (
         args.workspace_name is None
@@ -133,7 +536,7 @@ def _get_workspace_cmd(args):
     if args.workspace_id:
         try:
             workspace_response = get_workspace_by_id(
-                args.workspace_id, get_session_with_retry()
+                args.workspace_id, get_session_with_retry(), _parse_fields(args.fields)
             )
             workspace_response.raise_for_status()
             logging.info(json.dumps(workspace_response.json(), indent=4))
@@ -147,6 +550,7 @@ def _get_workspace_cmd(args):
             args.workspace_name,
             args.billing_project_name,
             get_session_with_retry(),
+            _parse_fields(args.fields),
         )
         try:
             workspace_response.raise_for_status()
@@ -158,6 +562,10 @@ def _get_workspace_cmd(args):
                 )
 
 
+def _parse_fields(fields: str | None) -> list[str] | None:
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("-u", "--user_token", required=False)
@@ -169,13 +577,75 @@ if __name__ == "__main__":
     get_subparser.add_argument("-w", "--workspace_name", required=False)
     get_subparser.add_argument("-bp", "--billing_project_name", required=False)
     get_subparser.add_argument("-i", "--workspace_id", required=False)
+    get_subparser.add_argument(
+        "-f",
+        "--fields",
+        required=False,
+        help="Comma-separated fields to fetch (e.g. workspace.state,accessLevel); defaults to the whole workspace",
+    )
     get_subparser.set_defaults(func=_get_workspace_cmd)
 
+    list_subparser = subparsers.add_parser("list")
+    list_subparser.add_argument("-bp", "--billing_project_name", required=False)
+    list_subparser.add_argument(
+        "-f",
+        "--fields",
+        required=False,
+        default=",".join(Workspace.FIELDS),
+        help="Comma-separated listing fields to fetch and output",
+    )
+    list_subparser.add_argument(
+        "-o", "--output_format", choices=["csv", "jsonl"], default="csv"
+    )
+    list_subparser.add_argument("-O", "--output_file", required=False)
+    list_subparser.set_defaults(func=_list_workspaces_cmd)
+
     delete_subparser = subparsers.add_parser("delete")
     delete_subparser.add_argument("-w", "--workspace_name", required=True)
     delete_subparser.add_argument("-bp", "--billing_project_name", required=True)
     delete_subparser.set_defaults(func=_delete_workspace_cmd)
 
+    create_subparser = subparsers.add_parser("create")
+    create_subparser.add_argument("-w", "--workspace_name", required=True)
+    create_subparser.add_argument("-bp", "--billing_project_name", required=True)
+    create_subparser.add_argument("--timeout", required=False, default=1800, type=int)
+    create_subparser.set_defaults(func=_create_workspace_cmd)
+
+    bulk_create_subparser = subparsers.add_parser("bulk_create")
+    bulk_create_subparser.add_argument("-bp", "--billing_project_name", required=True)
+    bulk_create_subparser.add_argument(
+        "-f", "--workspaces_file", required=False, help="File of workspace names"
+    )
+    bulk_create_subparser.add_argument(
+        "-t",
+        "--template",
+        required=False,
+        help="Workspace name template, formatted with n, e.g. load-test-{n:04d}",
+    )
+    bulk_create_subparser.add_argument("-n", "--count", required=False, type=int)
+    bulk_create_subparser.add_argument("--start", required=False, default=0, type=int)
+    bulk_create_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=8, type=int
+    )
+    bulk_create_subparser.add_argument(
+        "--timeout", required=False, default=1800, type=int
+    )
+    cli.setup_parser_shard_args(bulk_create_subparser)
+    bulk_create_subparser.set_defaults(func=_bulk_create_workspaces_cmd)
+
+    bulk_delete_subparser = subparsers.add_parser("bulk_delete")
+    bulk_delete_subparser.add_argument(
+        "-f",
+        "--workspaces_file",
+        required=True,
+        help="File of billing_project/workspace lines",
+    )
+    bulk_delete_subparser.add_argument(
+        "-c", "--concurrency", required=False, default=8, type=int
+    )
+    cli.setup_parser_shard_args(bulk_delete_subparser)
+    bulk_delete_subparser.set_defaults(func=_bulk_delete_workspaces_cmd)
+
     cli.setup_parser_terra_env_args(parser)
     args = cli.parse_args_and_init_config(parser)
 